@@ -0,0 +1,18 @@
+import asyncio
+import threading
+
+# Sync pipeline stages submit their async SDK calls to one shared background loop,
+# so async clients, pollers and semaphores live on a single loop for the whole process.
+_loop = None
+_lock = threading.Lock()
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ingestion-aio", daemon=True).start()
+    return _loop
+
+def run_coroutine(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
@@ -1,33 +1,101 @@
 from azure.storage.blob import BlobServiceClient
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+import fnmatch
+import hashlib
 import os
 import json
+from typing import Any, Deque, Dict, Iterable, List, Optional
 from dotenv import load_dotenv
+from helpers.spool import new_spool
 
 load_dotenv()
 
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER")
+BLOB_PREFIX = os.getenv("BLOB_PREFIX", "")
+BLOB_GLOB = os.getenv("BLOB_GLOB", "")
+BLOB_MAX_BYTES = os.getenv("BLOB_MAX_BYTES", "0")
+BLOB_DOWNLOAD_CONCURRENCY = os.getenv("BLOB_DOWNLOAD_CONCURRENCY", "4")
 
-blob_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-container_client = blob_client.get_container_client(CONTAINER)
+blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+container_client = blob_service_client.get_container_client(CONTAINER)
 
-def get_blobs():
-    blob_inputs = []
+def blob_patterns() -> List[str]:
+    return [p.strip() for p in BLOB_GLOB.split(",") if p.strip()]
 
-    # List all blobs inside container
-    for blob in container_client.list_blobs():
+def in_scope(name: str) -> bool:
+    # BLOB_GLOB is a comma-separated list of fnmatch patterns on the full blob name
+    patterns = blob_patterns()
+    return not patterns or any(fnmatch.fnmatch(name, p) for p in patterns)
+
+def too_large(entry: Dict[str, Any]) -> bool:
+    # BLOB_MAX_BYTES=0 disables the cap
+    return int(BLOB_MAX_BYTES) > 0 and (entry.get("size") or 0) > int(BLOB_MAX_BYTES)
+
+def list_blob_entries() -> List[Dict[str, Any]]:
+    # Listing only returns properties, so this is cheap even for large containers.
+    # Blobs outside BLOB_PREFIX / BLOB_GLOB are not part of the source at all.
+    entries: List[Dict[str, Any]] = []
+    for blob in container_client.list_blobs(name_starts_with=BLOB_PREFIX or None):
 
         # Skip folders (if virtual directory exists)
         if blob.name.endswith("/"):
             continue
 
-        blob_client = container_client.get_blob_client(blob.name)
-        file_bytes = blob_client.download_blob().readall()
+        if not in_scope(blob.name):
+            continue
 
-        blob_inputs.append({
+        entries.append({
+            "name": blob.name,
             "filename": blob.name.split("/")[-1],
-            "file_bytes": file_bytes,
-            "source_url": blob_client.url
+            "source_url": container_client.get_blob_client(blob.name).url,
+            "etag": blob.etag,
+            "last_modified": blob.last_modified.isoformat() if blob.last_modified else None,
+            "size": blob.size,
         })
-    
-    return blob_inputs
\ No newline at end of file
+    return entries
+
+def download_blob(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Streams the blob into a spooled temporary file, hashing as it goes. Returns None
+    # when the blob grew past BLOB_MAX_BYTES after it was listed.
+    downloader = container_client.get_blob_client(entry["name"]).download_blob()
+    spool = new_spool()
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in downloader.chunks():
+        size += len(chunk)
+        if too_large({"size": size}):
+            spool.close()
+            print(f"Skipping {entry['name']}: larger than BLOB_MAX_BYTES ({BLOB_MAX_BYTES})....")
+            return None
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return {**entry, "file": spool, "content_hash": digest.hexdigest()}
+
+def iter_blobs(entries: Iterable[Dict[str, Any]]):
+    # Up to BLOB_DOWNLOAD_CONCURRENCY downloads run ahead of the consumer; blobs are
+    # yielded in listing order, and each one is a spooled file the caller must close
+    workers = max(1, int(BLOB_DOWNLOAD_CONCURRENCY))
+    pending: Deque[Future] = deque()
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="blob-download") as pool:
+        try:
+            for entry in entries:
+                pending.append(pool.submit(download_blob, entry))
+                if len(pending) >= workers:
+                    doc = pending.popleft().result()
+                    if doc:
+                        yield doc
+            while pending:
+                doc = pending.popleft().result()
+                if doc:
+                    yield doc
+        finally:
+            # The consumer stopped early: drop whatever was downloaded ahead
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled() and future.exception() is None and future.result():
+                    future.result()["file"].close()
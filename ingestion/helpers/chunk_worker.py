@@ -0,0 +1,94 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import multiprocessing
+import os
+import threading
+from helpers.common import generate_chunk_id, generate_chunk_key
+from helpers.document_parser import SlimLayout, build_units_normalized, build_blocks
+from helpers.langchain import create_text_splitter
+
+load_dotenv()
+
+PARSE_WORKERS = os.getenv("PARSE_WORKERS", "0")
+
+# The CPU-bound half of chunking: parsing a slim layout into units, and turning units
+# into split, keyed chunks. Kept apart from helpers/chunking.py so worker processes
+# only import the parser and the splitter, not the Azure/OpenAI clients. Inputs and
+# outputs are slim records and plain dicts, never the full layout tree.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent has live client threads and an event loop
+            _pool = ProcessPoolExecutor(
+                max_workers=int(PARSE_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def run_in_worker(fn: Callable[..., Any], *args: Any) -> Any:
+    # PARSE_WORKERS=0 keeps the work on the calling thread
+    if int(PARSE_WORKERS) <= 0:
+        return fn(*args)
+    return _get_pool().submit(fn, *args).result()
+
+def parse_units(layout: SlimLayout) -> List[Dict[str, Any]]:
+    _, units = build_units_normalized(layout)
+    return units
+
+def split_offsets(splitter: Any, text: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    # (chunk text, start, end) for each chunk, with stripped character ranges into the
+    # block. The token splitter tracks the ranges itself; for LangChain's splitter each
+    # chunk is searched for after the previous one's start, the same way its
+    # add_start_index does it. A chunk that is not a verbatim substring (a splitter that
+    # rewrites whitespace, say) gets no range rather than a wrong one.
+    if hasattr(splitter, "split_offsets"):
+        return [(text[start:end], start, end) for start, end in splitter.split_offsets(text)]
+    out: List[Tuple[str, Optional[int], Optional[int]]] = []
+    pos = 0
+    for chunk in splitter.split_text(text):
+        chunk = (chunk or "").strip()
+        if not chunk:
+            continue
+        start = text.find(chunk, pos)
+        if start == -1:
+            out.append((chunk, None, None))
+            continue
+        out.append((chunk, start, start + len(chunk)))
+        pos = start + 1
+    return out
+
+def split_units(filename: str, units: List[Dict[str, Any]], source_url: str) -> List[Dict[str, Any]]:
+    blocks = build_blocks(units)
+    splitter = create_text_splitter()
+
+    title = os.path.basename(filename)
+    chunk_items: List[Dict[str, Any]] = []
+    chunk_counter = 1
+
+    for block in blocks:
+        for chunk_text, start, end in split_offsets(splitter, block.get("text", "") or ""):
+            if not chunk_text:
+                continue
+
+            raw_table_content = block.get("raw_table_content", "")
+            chunk_items.append(
+                {
+                    "id": generate_chunk_key(source_url, chunk_counter, chunk_text + "\n" + raw_table_content),
+                    "kind": block["kind"],
+                    "raw_table_content": raw_table_content,
+                    "title": title,
+                    "source_url": source_url,
+                    "chunk": chunk_text,
+                    "chunk_id": generate_chunk_id(filename, chunk_counter),
+                    "chunk_start": start,
+                    "chunk_end": end,
+                }
+            )
+            chunk_counter += 1
+
+    return chunk_items
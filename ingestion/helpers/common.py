@@ -1,6 +1,7 @@
 import os
 import re
-from typing import List, Any, Dict, Set
+import hashlib
+from typing import List, Any, Dict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +10,19 @@ INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX")
 OAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 OAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 OAI_EMBED_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+EMBEDDING_DIMENSIONS = os.getenv("EMBEDDING_DIMENSIONS", "")
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")
+VECTOR_RERANK_WITH_ORIGINAL = os.getenv("VECTOR_RERANK_WITH_ORIGINAL", "true")
+VECTOR_OVERSAMPLING = os.getenv("VECTOR_OVERSAMPLING", "10")
+VECTOR_STORED = os.getenv("VECTOR_STORED", "true")
+HNSW_M = os.getenv("HNSW_M", "4")
+HNSW_EF_CONSTRUCTION = os.getenv("HNSW_EF_CONSTRUCTION", "400")
+HNSW_EF_SEARCH = os.getenv("HNSW_EF_SEARCH", "500")
+
+# Native size of the embedding deployment; EMBEDDING_DIMENSIONS asks the model for
+# shorter vectors (text-embedding-3 models only)
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+COMPRESSION_KINDS = {"scalar": "scalarQuantization", "binary": "binaryQuantization"}
 
 def guess_content_type(filename: str) -> str:
     ext = os.path.splitext(filename.lower())[1]
@@ -23,26 +37,38 @@ def generate_chunk_id(filename: str, counter: int) -> str:
     safe = re.sub(r"[^a-zA-Z0-9_-]", "_", base)
     return f"{safe}_chunk{counter}"
 
-def escape_odata_string(s: str) -> str:
-    return s.replace("'", "''")
+def generate_chunk_key(source_url: str, position: int, text: str) -> str:
+    # Same document, same position, same text -> same key, so re-ingesting an
+    # unchanged chunk is a no-op for the index
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source_url}\n{position}\n{text_hash}".encode("utf-8")).hexdigest()
 
 def batched(seq: List[Any], batch_size: int):
     for i in range(0, len(seq), batch_size):
         yield seq[i:i + batch_size]
 
-def get_unique_source_urls(chunks: List[Dict[str, Any]]) -> List[str]:
-    seen: Set[str] = set()
-    out: List[str] = []
-    for c in chunks:
-        su = c.get("source_url")
-        if su and su not in seen:
-            seen.add(su)
-            out.append(su)
-    return out
 
-def build_source_url_filter(source_urls: List[str]) -> str:
-    return " or ".join([f"source_url eq '{escape_odata_string(su)}'" for su in source_urls])
+def embedding_dimensions() -> int:
+    return int(EMBEDDING_DIMENSIONS or DEFAULT_EMBEDDING_DIMENSIONS)
+
+def build_vector_compressions(name: str) -> List[Dict[str, Any]]:
+    # VECTOR_COMPRESSION: none | scalar (int8) | binary (1 bit per dimension). The
+    # quantized vectors are searched and the top candidates, oversampled, are re-ranked
+    # with the full-precision vectors
+    if VECTOR_COMPRESSION == "none":
+        return []
+    if VECTOR_COMPRESSION not in COMPRESSION_KINDS:
+        raise ValueError(f"VECTOR_COMPRESSION must be none, scalar or binary, got {VECTOR_COMPRESSION!r}")
 
+    compression: Dict[str, Any] = {
+        "name": name,
+        "kind": COMPRESSION_KINDS[VECTOR_COMPRESSION],
+        "rerankWithOriginalVectors": VECTOR_RERANK_WITH_ORIGINAL.lower() == "true",
+        "defaultOversampling": float(VECTOR_OVERSAMPLING),
+    }
+    if VECTOR_COMPRESSION == "scalar":
+        compression["scalarQuantizationParameters"] = {"quantizedDataType": "int8"}
+    return [compression]
 
 def build_index_payload() -> dict:
     index_name = INDEX_NAME
@@ -51,6 +77,11 @@ def build_index_payload() -> dict:
     vprofile_name = f"{index_name}-vprofile-hnsw-cosine"
     vectorizer_name = f"{index_name}-vectorizer"
     semantic_name = f"{index_name}-semantic-configuration"
+    compression_name = f"{index_name}-compression"
+
+    compressions = build_vector_compressions(compression_name)
+    # Retrieval never reads vectors back, so the retrievable copy can be dropped
+    vectors_stored = VECTOR_STORED.lower() == "true"
 
     return {
         "name": index_name,
@@ -111,6 +142,17 @@ def build_index_payload() -> dict:
                 "retrievable": True,
                 "stored": True,
             },
+            {
+                "name": "alias_sources",
+                "type": "Collection(Edm.String)",
+                "key": False,
+                "searchable": False,
+                "filterable": True,
+                "sortable": False,
+                "facetable": False,
+                "retrievable": True,
+                "stored": True,
+            },
             {
                 "name": "chunk",
                 "type": "Edm.String",
@@ -134,6 +176,28 @@ def build_index_payload() -> dict:
                 "retrievable": True,
                 "stored": True,
             },
+            {
+                "name": "chunk_start",
+                "type": "Edm.Int32",
+                "key": False,
+                "searchable": False,
+                "filterable": False,
+                "sortable": False,
+                "facetable": False,
+                "retrievable": True,
+                "stored": True,
+            },
+            {
+                "name": "chunk_end",
+                "type": "Edm.Int32",
+                "key": False,
+                "searchable": False,
+                "filterable": False,
+                "sortable": False,
+                "facetable": False,
+                "retrievable": True,
+                "stored": True,
+            },
             {
                 "name": "embedding",
                 "type": "Collection(Edm.Single)",
@@ -142,9 +206,9 @@ def build_index_payload() -> dict:
                 "filterable": False,
                 "sortable": False,
                 "facetable": False,
-                "retrievable": True,
-                "stored": True,
-                "dimensions": 1536,
+                "retrievable": vectors_stored,
+                "stored": vectors_stored,
+                "dimensions": embedding_dimensions(),
                 "vectorSearchProfile": vprofile_name,
             },
         ],
@@ -171,9 +235,9 @@ def build_index_payload() -> dict:
                     "kind": "hnsw",
                     "hnswParameters": {
                         "metric": "cosine",
-                        "m": 4,
-                        "efConstruction": 400,
-                        "efSearch": 500,
+                        "m": int(HNSW_M),
+                        "efConstruction": int(HNSW_EF_CONSTRUCTION),
+                        "efSearch": int(HNSW_EF_SEARCH),
                     },
                 }
             ],
@@ -182,6 +246,7 @@ def build_index_payload() -> dict:
                     "name": vprofile_name,
                     "algorithm": algo_name,
                     "vectorizer": vectorizer_name,
+                    **({"compression": compression_name} if compressions else {}),
                 }
             ],
             "vectorizers": [
@@ -196,7 +261,7 @@ def build_index_payload() -> dict:
                     },
                 }
             ],
-            "compressions": [],
+            "compressions": compressions,
         },
     }
 
@@ -1,25 +1,143 @@
 import os
+import re
+import asyncio
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
-from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
+from helpers.aio import run_coroutine
+from helpers.layout_cache import content_hash, get_cached_layout, put_cached_layout
+from helpers.spool import Buffer, BufferReader, buffer_view
 
 load_dotenv()
 
 DI_ENDPOINT = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
 DI_KEY = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
 DI_MODEL = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_MODEL")
+DI_MAX_CONCURRENT_DOCUMENTS = os.getenv("DI_MAX_CONCURRENT_DOCUMENTS", "4")
+DI_MAX_CONCURRENT_REQUESTS = os.getenv("DI_MAX_CONCURRENT_REQUESTS", "8")
+DI_PAGES_PER_REQUEST = os.getenv("DI_PAGES_PER_REQUEST", "50")
 
-di_client = DocumentIntelligenceClient(
-    endpoint=DI_ENDPOINT,
-    credential=AzureKeyCredential(DI_KEY),
-)
-
-def analyze_layout(file_bytes: bytes, content_type: str):
-    poller = di_client.begin_analyze_document(
-        model_id=DI_MODEL,
-        body=file_bytes,
-        content_type=content_type,
-    )
-    result = poller.result()
+PDF_CONTENT_TYPE = "application/pdf"
+CONTENT_SEPARATOR = "\n"
+ELEMENT_REF = re.compile(r"^/(paragraphs|tables|figures|sections)/(\d+)$")
+PDF_PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+# Created lazily on the shared background loop (see helpers/aio.py)
+_di_client: Optional[DocumentIntelligenceClient] = None
+_request_slots: Optional[asyncio.Semaphore] = None
+
+def _get_client() -> Tuple[DocumentIntelligenceClient, asyncio.Semaphore]:
+    global _di_client, _request_slots
+    if _di_client is None:
+        _di_client = DocumentIntelligenceClient(
+            endpoint=DI_ENDPOINT,
+            credential=AzureKeyCredential(DI_KEY),
+        )
+        _request_slots = asyncio.Semaphore(int(DI_MAX_CONCURRENT_REQUESTS))
+    return _di_client, _request_slots
+
+def count_pdf_pages(file_bytes: Buffer) -> int:
+    # Counts page objects without parsing the PDF. Returns 0 when pages live in
+    # compressed object streams, in which case the document is sent whole.
+    return len(PDF_PAGE_OBJECT.findall(file_bytes))
+
+def page_ranges(page_count: int, pages_per_request: int) -> List[str]:
+    if pages_per_request <= 0 or page_count <= pages_per_request:
+        return []
+    return [
+        f"{start}-{min(start + pages_per_request - 1, page_count)}"
+        for start in range(1, page_count + 1, pages_per_request)
+    ]
+
+async def _analyze(file_bytes: Buffer, content_type: str, pages: Optional[str] = None) -> Dict[str, Any]:
+    client, slots = _get_client()
+    async with slots:
+        # Each request streams from its own reader over the shared buffer
+        with BufferReader(file_bytes) as body:
+            poller = await client.begin_analyze_document(
+                model_id=DI_MODEL,
+                body=body,
+                content_type=content_type,
+                pages=pages,
+            )
+            result = await poller.result()
     return result.as_dict()
 
+def _shift_offsets(node: Any, base: int, element_bases: Dict[str, int]):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "spans" and isinstance(value, list):
+                for span in value:
+                    if isinstance(span, dict) and "offset" in span:
+                        span["offset"] += base
+            elif key == "elements" and isinstance(value, list):
+                node[key] = [_shift_element_ref(ref, element_bases) for ref in value]
+            else:
+                _shift_offsets(value, base, element_bases)
+    elif isinstance(node, list):
+        for value in node:
+            _shift_offsets(value, base, element_bases)
+
+def _shift_element_ref(ref: Any, element_bases: Dict[str, int]) -> Any:
+    m = ELEMENT_REF.match(ref) if isinstance(ref, str) else None
+    if not m:
+        return ref
+    return f"/{m.group(1)}/{int(m.group(2)) + element_bases.get(m.group(1), 0)}"
+
+def merge_layout_results(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Concatenate page-range results in page order, rebasing span offsets onto the
+    # merged `content` and element references onto the merged collections.
+    if len(parts) == 1:
+        return parts[0]
+
+    merged: Dict[str, Any] = {k: v for k, v in parts[0].items() if not isinstance(v, list) and k != "content"}
+    content = ""
+    collections: Dict[str, List[Any]] = {}
+
+    for part in parts:
+        base = len(content) + len(CONTENT_SEPARATOR) if content else 0
+        element_bases = {name: len(items) for name, items in collections.items()}
+        _shift_offsets(part, base, element_bases)
+
+        part_content = part.get("content") or ""
+        content = content + CONTENT_SEPARATOR + part_content if content else part_content
+
+        for key, value in part.items():
+            if isinstance(value, list):
+                collections.setdefault(key, []).extend(value)
+
+    merged["content"] = content
+    merged.update(collections)
+    return merged
+
+async def analyze_layout_async(file_bytes: Buffer, content_type: str) -> Dict[str, Any]:
+    ranges: List[str] = []
+    if content_type == PDF_CONTENT_TYPE:
+        ranges = page_ranges(count_pdf_pages(file_bytes), int(DI_PAGES_PER_REQUEST))
+
+    if not ranges:
+        return await _analyze(file_bytes, content_type)
+
+    # Let every range finish before failing, so none is still reading the buffer
+    parts = await asyncio.gather(*[_analyze(file_bytes, content_type, pages=r) for r in ranges], return_exceptions=True)
+    for part in parts:
+        if isinstance(part, BaseException):
+            raise part
+    return merge_layout_results(list(parts))
+
+def analyze_layout(file: Union[bytes, BinaryIO], content_type: str, file_hash: Optional[str] = None):
+    # file is the document's bytes or a spooled file (helpers/blob.py). Unchanged bytes
+    # analyzed by the same model never go back to Document Intelligence, so a cache hit
+    # never reads the file at all.
+    if file_hash is None:
+        with buffer_view(file) as view:
+            file_hash = content_hash(view)
+    cached = get_cached_layout(file_hash, DI_MODEL)
+    if cached is not None:
+        return cached
+
+    with buffer_view(file) as view:
+        result_dict = run_coroutine(analyze_layout_async(view, content_type))
+    put_cached_layout(file_hash, DI_MODEL, result_dict)
+    return result_dict
@@ -1,8 +1,46 @@
-from typing import Any, Dict, List, Optional, Tuple
-
-def build_units_normalized(result_dict: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
-    paragraph_items = extract_paragraph_items(result_dict)
-    table_items = extract_table_items(result_dict)
+from typing import Any, Dict, List, Optional, Tuple, Union
+from bisect import bisect_left
+import math
+
+BBox = Tuple[float, float, float, float]
+
+class LayoutItem:
+    # Just what dedup and unit building read from a Document Intelligence paragraph or
+    # table: first span, first bounding region reduced to a bbox, and the text (tables
+    # are flattened from their cells up front). The rest of the layout tree can be
+    # released as soon as these are built.
+    __slots__ = ("kind", "index", "text", "span", "page", "bbox")
+
+    def __init__(self, kind: str, index: int, text: str, raw: Dict[str, Any]):
+        self.kind = kind
+        self.index = index
+        self.text = text
+
+        spans = raw.get("spans") or []
+        s0 = spans[0] if spans else {}
+        self.span: Optional[Tuple[int, int]] = (s0["offset"], s0["length"]) if "offset" in s0 and "length" in s0 else None
+
+        brs = raw.get("boundingRegions") or []
+        br0 = brs[0] if brs and isinstance(brs[0], dict) else {}
+        poly = br0.get("polygon")
+        self.page: Optional[int] = br0.get("pageNumber")
+        self.bbox: Optional[BBox] = polygon_to_bbox(poly) if poly else None
+
+class SlimLayout:
+    __slots__ = ("paragraphs", "tables")
+
+    def __init__(self, paragraphs: List[LayoutItem], tables: List[LayoutItem]):
+        self.paragraphs = paragraphs
+        self.tables = tables
+
+def slim_layout(result_dict: Dict[str, Any]) -> SlimLayout:
+    return SlimLayout(extract_paragraph_items(result_dict), extract_table_items(result_dict))
+
+def build_units_normalized(layout: Union[SlimLayout, Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    if not isinstance(layout, SlimLayout):
+        layout = slim_layout(layout)
+    paragraph_items = layout.paragraphs
+    table_items = layout.tables
 
     strategy = choose_strategy(paragraph_items, table_items)
     if strategy == "spans":
@@ -11,23 +49,23 @@ def build_units_normalized(result_dict: Dict[str, Any]) -> Tuple[str, List[Dict[
         units = build_units_polygon(paragraph_items, table_items, iou_threshold=0.35)
     else:
         units = (
-            [{"type": "paragraph", "text": p["text"], "meta": {"index": p["index"]}} for p in paragraph_items]
-            + [{"type": "table", "text": t["text"], "meta": {"index": t["index"]}} for t in table_items]
+            [{"type": "paragraph", "text": p.text, "meta": {"index": p.index}} for p in paragraph_items]
+            + [{"type": "table", "text": t.text, "meta": {"index": t.index}} for t in table_items]
         )
 
     return strategy, units
 
-def extract_paragraph_items(rd: Dict[str, Any]) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def extract_paragraph_items(rd: Dict[str, Any]) -> List[LayoutItem]:
+    items: List[LayoutItem] = []
     for i, p in enumerate(rd.get("paragraphs") or []):
         text = (p.get("content") or "").strip()
         if not text:
             continue
-        items.append({"kind": "paragraph", "index": i, "raw": p, "text": text})
+        items.append(LayoutItem("paragraph", i, text, p))
     return items
 
-def extract_table_items(rd: Dict[str, Any]) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def extract_table_items(rd: Dict[str, Any]) -> List[LayoutItem]:
+    items: List[LayoutItem] = []
     for i, t in enumerate(rd.get("tables") or []):
         cells = t.get("cells") or []
         if not cells:
@@ -45,82 +83,82 @@ def extract_table_items(rd: Dict[str, Any]) -> List[Dict[str, Any]]:
             lines = [" | ".join(row).strip() for row in grid if any(x.strip() for x in row)]
             table_text = "\n".join(lines).strip()
 
-        items.append({"kind": "table", "index": i, "raw": t, "text": table_text})
+        items.append(LayoutItem("table", i, table_text, t))
     return items
 
-def choose_strategy(paragraph_items: List[Dict[str, Any]], table_items: List[Dict[str, Any]]) -> str:
-    spans_ok = any(has_spans(p["raw"]) for p in paragraph_items) and any(has_spans(t["raw"]) for t in table_items)
-    poly_ok = any(has_polygon(p["raw"]) for p in paragraph_items) and any(has_polygon(t["raw"]) for t in table_items)
+def choose_strategy(paragraph_items: List[LayoutItem], table_items: List[LayoutItem]) -> str:
+    spans_ok = any(has_spans(p) for p in paragraph_items) and any(has_spans(t) for t in table_items)
+    poly_ok = any(has_polygon(p) for p in paragraph_items) and any(has_polygon(t) for t in table_items)
     if spans_ok:
         return "spans"
     if poly_ok:
         return "polygon"
     return "none"
 
-def has_spans(item_raw: Dict[str, Any]) -> bool:
-    spans = item_raw.get("spans") or []
-    return bool(spans) and "offset" in spans[0] and "length" in spans[0]
-
+def has_spans(item: LayoutItem) -> bool:
+    return item.span is not None
 
-def has_polygon(item_raw: Dict[str, Any]) -> bool:
-    brs = item_raw.get("boundingRegions") or []
-    if not brs:
-        return False
-    poly = (brs[0].get("polygon") if isinstance(brs[0], dict) else None)
-    return bool(poly)
 
-def spans_range(item_raw: Dict[str, Any]) -> Tuple[int, int]:
-    s = (item_raw.get("spans") or [])[0]
-    return s["offset"], s["offset"] + s["length"]
+def has_polygon(item: LayoutItem) -> bool:
+    return item.bbox is not None
 
+def spans_range(item: LayoutItem) -> Tuple[int, int]:
+    offset, length = item.span
+    return offset, offset + length
 
-def build_units_spans(paragraph_items: List[Dict[str, Any]], table_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
 
-    for p in paragraph_items:
-        start, end = spans_range(p["raw"])
-        items.append({**p, "start": start, "end": end})
+def build_units_spans(paragraph_items: List[LayoutItem], table_items: List[LayoutItem]) -> List[Dict[str, Any]]:
+    items: List[Tuple[int, int, LayoutItem]] = []
 
-    for t in table_items:
-        start, end = spans_range(t["raw"])
-        items.append({**t, "start": start, "end": end})
+    for it in paragraph_items + table_items:
+        start, end = spans_range(it)
+        items.append((start, end, it))
 
-    items.sort(key=lambda x: x["start"])
+    items.sort(key=lambda x: x[0])
 
     # Dedup: drop paragraph if it overlaps any table span
-    table_spans = [(x["start"], x["end"]) for x in items if x["kind"] == "table"]
-
-    def overlaps(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
-        return max(a[0], b[0]) < min(a[1], b[1])
+    starts, ends = merge_spans([(start, end) for start, end, it in items if it.kind == "table"])
 
     units: List[Dict[str, Any]] = []
-    for it in items:
-        if it["kind"] == "paragraph":
-            pr = (it["start"], it["end"])
-            if any(overlaps(pr, tr) for tr in table_spans):
-                continue
-        units.append({"type": it["kind"], "text": it["text"], "meta": {"index": it["index"]}})
+    for start, end, it in items:
+        if it.kind == "paragraph" and overlaps_merged(starts, ends, start, end):
+            continue
+        units.append({"type": it.kind, "text": it.text, "meta": {"index": it.index}})
     return units
 
-def polygon_to_bbox(poly: List[float]) -> Tuple[float, float, float, float]:
+def merge_spans(spans: List[Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+    # Union of half-open spans as sorted, disjoint [start, end) lists. Empty spans
+    # cannot overlap anything, so they are dropped.
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in sorted(s for s in spans if s[0] < s[1]):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+def overlaps_merged(starts: List[int], ends: List[int], start: int, end: int) -> bool:
+    # Only the last merged span starting before `end` can reach past `start`
+    if start >= end:
+        return False
+    i = bisect_left(starts, end) - 1
+    return i >= 0 and ends[i] > start
+
+def polygon_to_bbox(poly: List[float]) -> BBox:
     xs = poly[0::2]
     ys = poly[1::2]
     return (min(xs), min(ys), max(xs), max(ys))
 
 
-def page_and_bbox(item_raw: Dict[str, Any]) -> Tuple[Optional[int], Optional[Tuple[float, float, float, float]]]:
-    brs = item_raw.get("boundingRegions") or []
-    if not brs:
-        return None, None
-    br0 = brs[0]
-    page = br0.get("pageNumber")
-    poly = br0.get("polygon")
-    if not page or not poly:
-        return page, None
-    return page, polygon_to_bbox(poly)
+def page_and_bbox(item: LayoutItem) -> Tuple[Optional[int], Optional[BBox]]:
+    if not item.page or not item.bbox:
+        return item.page, None
+    return item.page, item.bbox
 
 
-def bbox_iou(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+def bbox_iou(a: BBox, b: BBox) -> float:
     ax1, ay1, ax2, ay2 = a
     bx1, by1, bx2, by2 = b
     ix1, iy1 = max(ax1, bx1), max(ay1, by1)
@@ -133,34 +171,86 @@ def bbox_iou(a: Tuple[float, float, float, float], b: Tuple[float, float, float,
     return inter / union if union > 0 else 0.0
 
 
+def build_bbox_grid(boxes: List[BBox]) -> Dict[str, Any]:
+    # Uniform grid over the boxes' extent with about one cell per box; each box is
+    # listed in every cell it covers
+    x0 = min(b[0] for b in boxes)
+    y0 = min(b[1] for b in boxes)
+    x1 = max(b[2] for b in boxes)
+    y1 = max(b[3] for b in boxes)
+    n = max(1, math.isqrt(len(boxes)))
+    grid = {
+        "extent": (x0, y0, x1, y1),
+        "n": n,
+        "cell_w": (x1 - x0) / n or 1.0,
+        "cell_h": (y1 - y0) / n or 1.0,
+        "cells": {},
+    }
+    for i, b in enumerate(boxes):
+        for cell in _grid_cells(grid, b):
+            grid["cells"].setdefault(cell, []).append(i)
+    return grid
+
+def _grid_cells(grid: Dict[str, Any], bbox: BBox):
+    x0, y0, _, _ = grid["extent"]
+    n = grid["n"]
+
+    def col(x: float) -> int:
+        return min(n - 1, max(0, int((x - x0) / grid["cell_w"])))
+
+    def row(y: float) -> int:
+        return min(n - 1, max(0, int((y - y0) / grid["cell_h"])))
+
+    for c in range(col(bbox[0]), col(bbox[2]) + 1):
+        for r in range(row(bbox[1]), row(bbox[3]) + 1):
+            yield (c, r)
+
+def grid_candidates(grid: Dict[str, Any], bbox: BBox) -> List[int]:
+    ex0, ey0, ex1, ey1 = grid["extent"]
+    if bbox[2] < ex0 or bbox[0] > ex1 or bbox[3] < ey0 or bbox[1] > ey1:
+        return []
+    seen = set()
+    out: List[int] = []
+    for cell in _grid_cells(grid, bbox):
+        for i in grid["cells"].get(cell, ()):
+            if i not in seen:
+                seen.add(i)
+                out.append(i)
+    return out
+
 def build_units_polygon(
-    paragraph_items: List[Dict[str, Any]],
-    table_items: List[Dict[str, Any]],
+    paragraph_items: List[LayoutItem],
+    table_items: List[LayoutItem],
     iou_threshold: float = 0.35
 ) -> List[Dict[str, Any]]:
-    tables: List[Dict[str, Any]] = []
-    for t in table_items:
-        page, bbox = page_and_bbox(t["raw"])
-        tables.append({**t, "page": page, "bbox": bbox})
+    # (page, bbox, item)
+    tables = [(*page_and_bbox(t), t) for t in table_items]
 
-    tables_by_page: Dict[int, List[Dict[str, Any]]] = {}
-    for t in tables:
-        if t["page"] and t["bbox"]:
-            tables_by_page.setdefault(t["page"], []).append(t)
+    tables_by_page: Dict[int, List[BBox]] = {}
+    for page, bbox, _ in tables:
+        if page and bbox:
+            tables_by_page.setdefault(page, []).append(bbox)
+    grids = {page: build_bbox_grid(boxes) for page, boxes in tables_by_page.items()}
 
-    kept_paras: List[Dict[str, Any]] = []
+    kept_paras: List[Tuple[Optional[int], Optional[BBox], LayoutItem]] = []
     for p in paragraph_items:
-        page, bbox = page_and_bbox(p["raw"])
+        page, bbox = page_and_bbox(p)
         if not page or not bbox:
-            kept_paras.append({**p, "page": page, "bbox": bbox})
+            kept_paras.append((page, bbox, p))
             continue
-        overlapped = any(bbox_iou(bbox, t["bbox"]) >= iou_threshold for t in tables_by_page.get(page, []))
+        page_tables = tables_by_page.get(page, [])
+        if iou_threshold > 0:
+            # A positive IoU needs the boxes to intersect, so only tables sharing a grid cell can match
+            candidates = (page_tables[i] for i in grid_candidates(grids[page], bbox)) if page_tables else ()
+        else:
+            candidates = page_tables
+        overlapped = any(bbox_iou(bbox, tb) >= iou_threshold for tb in candidates)
         if not overlapped:
-            kept_paras.append({**p, "page": page, "bbox": bbox})
+            kept_paras.append((page, bbox, p))
 
-    def sort_key(x: Dict[str, Any]):
-        page = x.get("page") or 10**9
-        bbox = x.get("bbox")
+    def sort_key(x: Tuple[Optional[int], Optional[BBox], LayoutItem]):
+        page = x[0] or 10**9
+        bbox = x[1]
         if bbox:
             x1, y1, _, _ = bbox
             return (page, y1, x1)
@@ -169,7 +259,7 @@ def build_units_polygon(
     merged = kept_paras + tables
     merged.sort(key=sort_key)
 
-    units = [{"type": x["kind"], "text": x["text"], "meta": {"index": x["index"]}} for x in merged]
+    units = [{"type": it.kind, "text": it.text, "meta": {"index": it.index}} for _, _, it in merged]
     return units
 
 def build_blocks(units: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional, Sequence
+from array import array
+from dotenv import load_dotenv
+import hashlib
+import mmap
+import os
+import re
+import threading
+from helpers.state import state_db
+
+load_dotenv()
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+FLOAT_BYTES = 4
+WHITESPACE = re.compile(r"\s+")
+
+# (deployment, text hash) -> row in an append-only float32 file per deployment/dimension.
+# Rows are read back through mmap, so cached vectors are not held in Python memory.
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            deployment TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            dims INTEGER NOT NULL,
+            row INTEGER NOT NULL,
+            PRIMARY KEY (deployment, text_hash)
+        )
+        """
+    )
+
+_lock = threading.Lock()
+_maps: Dict[str, mmap.mmap] = {}
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", text or "").strip()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def _vector_path(deployment: str, dims: int) -> str:
+    safe = re.sub(r"[^a-zA-Z0-9_.-]", "_", deployment or "default")
+    return os.path.join(EMBEDDING_CACHE_DIR, f"{safe}-{dims}.f32")
+
+def _read_row(path: str, dims: int, row: int) -> Optional[List[float]]:
+    start = row * dims * FLOAT_BYTES
+    end = start + dims * FLOAT_BYTES
+
+    m = _maps.get(path)
+    if m is None or len(m) < end:
+        # The file has grown since it was mapped
+        if m is not None:
+            m.close()
+        with open(path, "rb") as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _maps[path] = m
+        if len(m) < end:
+            return None
+
+    vec = array("f")
+    vec.frombytes(m[start:end])
+    return vec.tolist()
+
+def get_cached_embeddings(deployment: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+    if not hashes:
+        return {}
+
+    unique = list(dict.fromkeys(hashes))
+    rows = []
+    with state_db() as db:
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            rows.extend(db.execute(
+                f"SELECT text_hash, dims, row FROM embedding_cache WHERE deployment = ? AND text_hash IN ({','.join('?' * len(part))})",
+                [deployment, *part],
+            ).fetchall())
+
+    found: Dict[str, List[float]] = {}
+    with _lock:
+        for r in rows:
+            path = _vector_path(deployment, r["dims"])
+            if not os.path.exists(path):
+                continue
+            vec = _read_row(path, r["dims"], r["row"])
+            if vec is not None:
+                found[r["text_hash"]] = vec
+    return found
+
+def put_cached_embeddings(deployment: str, vectors: Dict[str, List[float]]):
+    if not vectors:
+        return
+
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    entries = []
+    with _lock:
+        by_dims: Dict[int, List[str]] = {}
+        for h, vec in vectors.items():
+            by_dims.setdefault(len(vec), []).append(h)
+
+        for dims, hashes in by_dims.items():
+            path = _vector_path(deployment, dims)
+            with open(path, "ab") as f:
+                row_bytes = dims * FLOAT_BYTES
+                row, partial = divmod(f.tell(), row_bytes)
+                if partial:
+                    # Drop a torn row left by an interrupted write
+                    f.truncate(row * row_bytes)
+                buf = array("f")
+                for h in hashes:
+                    buf.extend(vectors[h])
+                    entries.append((deployment, h, dims, row))
+                    row += 1
+                f.write(buf.tobytes())
+
+    with state_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (deployment, text_hash, dims, row) VALUES (?, ?, ?, ?)",
+            entries,
+        )
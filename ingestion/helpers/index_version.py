@@ -0,0 +1,31 @@
+from typing import Any, Dict
+from dotenv import load_dotenv
+import json
+import os
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+# Shared with the retrieval service, which keys its response cache on this stamp. The
+# default is the git-ignored .cache/ at the repository root, found from this file rather
+# than the working directory, so both services agree wherever they are started from.
+# Point both INDEX_VERSION_FILE settings at the same absolute path otherwise.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE") or os.path.join(REPO_ROOT, ".cache", "index_version.json")
+
+_lock = threading.Lock()
+
+def bump_index_version(reason: str) -> Dict[str, Any]:
+    # Called after anything that changes what search can return
+    stamp = {"version": uuid.uuid4().hex, "reason": reason, "updated_at": time.time()}
+    with _lock:
+        folder = os.path.dirname(INDEX_VERSION_FILE)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{INDEX_VERSION_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stamp, f)
+        os.replace(tmp, INDEX_VERSION_FILE)
+    return stamp
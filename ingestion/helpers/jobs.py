@@ -0,0 +1,188 @@
+from typing import Any, Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from helpers.pipeline import ingest_blobs
+from helpers.state import state_db
+
+load_dotenv()
+
+INGEST_JOB_WORKERS = os.getenv("INGEST_JOB_WORKERS", "1")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Jobs and their per-document checkpoints are persisted so `/ingest/{id}` survives a
+# restart. A resumed job skips the documents its checkpoints show as uploaded; the
+# layout/embedding caches mean it does not repeat DI or embedding calls for the
+# documents that were in flight when it stopped.
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            options TEXT NOT NULL,
+            progress TEXT NOT NULL DEFAULT '{}',
+            result TEXT,
+            error TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL
+        )
+        """
+    )
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_job_documents (
+            job_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            updated_at REAL,
+            PRIMARY KEY (job_id, name)
+        )
+        """
+    )
+    # Anything still marked active belongs to a process that is gone
+    _db.execute(
+        f"UPDATE ingest_jobs SET status = 'interrupted' WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+        ACTIVE_STATUSES,
+    )
+
+_executor = ThreadPoolExecutor(max_workers=int(INGEST_JOB_WORKERS), thread_name_prefix="ingest-job")
+_lock = threading.Lock()
+_cancel_events: Dict[str, threading.Event] = {}
+_progress: Dict[str, Dict[str, Any]] = {}
+
+def _save(job_id: str, **fields: Any):
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    values = [json.dumps(v) if k in ("options", "progress", "result") else v for k, v in fields.items()]
+    with state_db() as db:
+        db.execute(f"UPDATE ingest_jobs SET {cols} WHERE id = ?", [*values, job_id])
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job = dict(row)
+    for k in ("options", "progress", "result"):
+        job[k] = json.loads(job[k]) if job[k] else None
+    return job
+
+def _snapshot_progress(job_id: str) -> Dict[str, Any]:
+    with _lock:
+        p = _progress.get(job_id)
+        if p is None:
+            return {}
+        elapsed = max(time.time() - p["started_at"], 1e-6)
+        return {
+            "documents_total": p["documents_total"],
+            "stages": dict(p["stages"]),
+            "throughput_docs_per_second": {k: round(v / elapsed, 3) for k, v in p["stages"].items()},
+            "elapsed_seconds": round(elapsed, 1),
+        }
+
+def _uploaded_documents(job_id: str) -> Set[str]:
+    with state_db() as db:
+        rows = db.execute(
+            "SELECT name FROM ingest_job_documents WHERE job_id = ? AND stage = 'upload'",
+            (job_id,),
+        ).fetchall()
+    return {r["name"] for r in rows}
+
+def _run_job(job_id: str, options: Dict[str, Any], skip: Optional[Set[str]] = None):
+    stop = _cancel_events[job_id]
+    if stop.is_set():
+        _save(job_id, status="cancelled", finished_at=time.time())
+        return
+
+    with _lock:
+        _progress[job_id] = {"started_at": time.time(), "documents_total": None, "stages": {}}
+    _save(job_id, status="running", started_at=time.time())
+
+    def on_start(total: int):
+        with _lock:
+            _progress[job_id]["documents_total"] = total
+
+    def on_progress(stage: str, doc: Dict[str, Any]):
+        if stage == "upload" and doc.get("upload_failed"):
+            # Not a finished document: a resume has to process it again
+            stage = "upload_failed"
+        with _lock:
+            stages = _progress[job_id]["stages"]
+            stages[stage] = stages.get(stage, 0) + 1
+        with state_db() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO ingest_job_documents (job_id, name, stage, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, doc.get("name"), stage, time.time()),
+            )
+
+    try:
+        result = ingest_blobs(full=options.get("full", False), stop=stop, on_start=on_start, on_progress=on_progress, skip=skip)
+        _save(job_id, status=result["status"], result=result, progress=_snapshot_progress(job_id), finished_at=time.time())
+        print(f"Ingestion job {job_id} {result['status']}: {result}")
+    except Exception as e:
+        traceback.print_exc()
+        _save(job_id, status="failed", error=str(e), progress=_snapshot_progress(job_id), finished_at=time.time())
+    finally:
+        with _lock:
+            _progress.pop(job_id, None)
+            _cancel_events.pop(job_id, None)
+
+def _enqueue(job_id: str, options: Dict[str, Any], skip: Optional[Set[str]] = None):
+    with _lock:
+        _cancel_events[job_id] = threading.Event()
+    _executor.submit(_run_job, job_id, options, skip)
+
+def submit_ingest_job(full: bool = False) -> Dict[str, Any]:
+    job_id = str(uuid.uuid4())
+    options = {"full": full}
+    with state_db() as db:
+        db.execute(
+            "INSERT INTO ingest_jobs (id, status, options, created_at) VALUES (?, 'queued', ?, ?)",
+            (job_id, json.dumps(options), time.time()),
+        )
+    _enqueue(job_id, options)
+    return get_job(job_id)
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with state_db() as db:
+        row = db.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        docs = db.execute(
+            "SELECT stage, COUNT(*) AS n FROM ingest_job_documents WHERE job_id = ? GROUP BY stage",
+            (job_id,),
+        ).fetchall()
+
+    job = _row_to_job(row)
+    if job["status"] == "running":
+        job["progress"] = _snapshot_progress(job_id)
+    job["documents_by_last_stage"] = {r["stage"]: r["n"] for r in docs}
+    return job
+
+def list_jobs(limit: int = 20) -> List[Dict[str, Any]]:
+    with state_db() as db:
+        rows = db.execute("SELECT id FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [get_job(r["id"]) for r in rows]
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        stop = _cancel_events.get(job_id)
+    if stop is not None:
+        stop.set()
+    return get_job(job_id)
+
+def resume_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = get_job(job_id)
+    if job is None or job["status"] in ACTIVE_STATUSES:
+        return job
+
+    # Same options, minus every document this job already uploaded (which matters for
+    # full=true; an incremental run would find them unchanged in the manifest anyway)
+    skip = _uploaded_documents(job_id)
+    print(f"Resuming ingestion job {job_id}, skipping {len(skip)} uploaded documents....")
+    _save(job_id, status="queued", error=None, finished_at=None)
+    _enqueue(job_id, job["options"], skip)
+    return get_job(job_id)
@@ -0,0 +1,61 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import time
+from helpers.state import state_db
+
+# chunk key -> source_url for everything this service has written to the index, so
+# re-ingest and delete planning never has to query the index for keys.
+# Kept in step by the upload/delete helpers in helpers/search.py.
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chunk_key_registry (
+            key TEXT PRIMARY KEY,
+            source_url TEXT NOT NULL,
+            registered_at REAL
+        )
+        """
+    )
+    _db.execute("CREATE INDEX IF NOT EXISTS chunk_key_registry_source ON chunk_key_registry (source_url)")
+
+def keys_for_source(source_url: str) -> List[str]:
+    with state_db() as db:
+        rows = db.execute("SELECT key FROM chunk_key_registry WHERE source_url = ? ORDER BY key", (source_url,)).fetchall()
+    return [r["key"] for r in rows]
+
+def keys_in_range(lo: Optional[str], hi: Optional[str]) -> Dict[str, str]:
+    # [lo, hi) in key order; None leaves that end open
+    sql = "SELECT key, source_url FROM chunk_key_registry WHERE 1 = 1"
+    args: List[str] = []
+    if lo is not None:
+        sql += " AND key >= ?"
+        args.append(lo)
+    if hi is not None:
+        sql += " AND key < ?"
+        args.append(hi)
+    with state_db() as db:
+        rows = db.execute(sql, args).fetchall()
+    return {r["key"]: r["source_url"] for r in rows}
+
+def register_keys(pairs: Iterable[Tuple[str, str]]):
+    # (key, source_url)
+    now = time.time()
+    with state_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO chunk_key_registry (key, source_url, registered_at) VALUES (?, ?, ?)",
+            [(k, su, now) for k, su in pairs],
+        )
+
+def unregister_keys(keys: Iterable[str]):
+    with state_db() as db:
+        db.executemany("DELETE FROM chunk_key_registry WHERE key = ?", [(k,) for k in keys])
+
+def clear_registry():
+    with state_db() as db:
+        db.execute("DELETE FROM chunk_key_registry")
+
+def registry_stats() -> Dict[str, Any]:
+    with state_db() as db:
+        row = db.execute(
+            "SELECT COUNT(*) AS keys, COUNT(DISTINCT source_url) AS sources FROM chunk_key_registry"
+        ).fetchone()
+    return {"keys": row["keys"], "sources": row["sources"]}
@@ -1,15 +1,28 @@
 from dotenv import load_dotenv
 import os
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from helpers.text_splitter import TokenTextSplitter
 
 load_dotenv()
 
 DEFAULT_CHUNK_SIZE = os.getenv("DEFAULT_CHUNK_SIZE")
 DEFAULT_CHUNK_OVERLAP = os.getenv("DEFAULT_CHUNK_OVERLAP")
+TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "character")
+CHUNK_SIZE_TOKENS = os.getenv("CHUNK_SIZE_TOKENS", "300")
+CHUNK_OVERLAP_TOKENS = os.getenv("CHUNK_OVERLAP_TOKENS", "40")
+
+SEPARATORS = ["\n\n", "\n", " ", ""]
 
 def create_text_splitter():
+    # "token" sizes chunks in TOKEN_ENCODING tokens; "character" is the LangChain splitter
+    if TEXT_SPLITTER == "token":
+        return TokenTextSplitter(
+            chunk_size=int(CHUNK_SIZE_TOKENS),
+            chunk_overlap=int(CHUNK_OVERLAP_TOKENS),
+            separators=SEPARATORS,
+        )
     return RecursiveCharacterTextSplitter(
         chunk_size=int(DEFAULT_CHUNK_SIZE),
         chunk_overlap=int(DEFAULT_CHUNK_OVERLAP),
-        separators=["\n\n", "\n", " ", ""],
-    )
\ No newline at end of file
+        separators=SEPARATORS,
+    )
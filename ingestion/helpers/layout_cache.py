@@ -0,0 +1,124 @@
+from typing import Any, Dict, List, Optional, Union
+from dotenv import load_dotenv
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+
+load_dotenv()
+
+LAYOUT_CACHE_DIR = os.getenv("LAYOUT_CACHE_DIR", ".cache/layout")
+LAYOUT_CACHE_MAX_BYTES = os.getenv("LAYOUT_CACHE_MAX_BYTES", str(2 * 1024 ** 3))
+
+ENTRY_SUFFIX = ".json.z"
+
+_lock = threading.Lock()
+
+def content_hash(file_bytes: Union[bytes, mmap.mmap]) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def _entry_path(file_hash: str, model_id: str) -> str:
+    safe_model = re.sub(r"[^a-zA-Z0-9_.-]", "_", model_id or "default")
+    return os.path.join(LAYOUT_CACHE_DIR, f"{file_hash}.{safe_model}{ENTRY_SUFFIX}")
+
+def _list_entries() -> List[Dict[str, Any]]:
+    if not os.path.isdir(LAYOUT_CACHE_DIR):
+        return []
+    entries: List[Dict[str, Any]] = []
+    for name in os.listdir(LAYOUT_CACHE_DIR):
+        if not name.endswith(ENTRY_SUFFIX):
+            continue
+        path = os.path.join(LAYOUT_CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        file_hash, _, model_id = name[: -len(ENTRY_SUFFIX)].partition(".")
+        entries.append({
+            "path": path,
+            "file_hash": file_hash,
+            "model_id": model_id,
+            "bytes": st.st_size,
+            "last_used": st.st_mtime,
+        })
+    return entries
+
+def get_cached_layout(file_hash: str, model_id: str) -> Optional[Dict[str, Any]]:
+    path = _entry_path(file_hash, model_id)
+    try:
+        with open(path, "rb") as f:
+            payload = f.read()
+    except FileNotFoundError:
+        return None
+
+    # mtime doubles as the LRU clock
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return json.loads(zlib.decompress(payload))
+
+def put_cached_layout(file_hash: str, model_id: str, result_dict: Dict[str, Any]):
+    os.makedirs(LAYOUT_CACHE_DIR, exist_ok=True)
+    payload = zlib.compress(json.dumps(result_dict, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+    path = _entry_path(file_hash, model_id)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    evict_layout_cache(int(LAYOUT_CACHE_MAX_BYTES))
+
+def evict_layout_cache(max_bytes: int) -> int:
+    with _lock:
+        entries = sorted(_list_entries(), key=lambda e: e["last_used"])
+        total = sum(e["bytes"] for e in entries)
+        evicted = 0
+        for e in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(e["path"])
+            except FileNotFoundError:
+                pass
+            total -= e["bytes"]
+            evicted += 1
+        return evicted
+
+def layout_cache_stats(include_entries: bool = False) -> Dict[str, Any]:
+    entries = _list_entries()
+    stats: Dict[str, Any] = {
+        "dir": os.path.abspath(LAYOUT_CACHE_DIR),
+        "entries": len(entries),
+        "bytes": sum(e["bytes"] for e in entries),
+        "max_bytes": int(LAYOUT_CACHE_MAX_BYTES),
+    }
+    if include_entries:
+        stats["items"] = [
+            {
+                "file_hash": e["file_hash"],
+                "model_id": e["model_id"],
+                "bytes": e["bytes"],
+                "last_used": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(e["last_used"])),
+            }
+            for e in sorted(entries, key=lambda e: e["last_used"], reverse=True)
+        ]
+    return stats
+
+def purge_layout_cache(model_id: Optional[str] = None) -> Dict[str, Any]:
+    removed = 0
+    with _lock:
+        for e in _list_entries():
+            if model_id and e["model_id"] != model_id:
+                continue
+            try:
+                os.remove(e["path"])
+            except FileNotFoundError:
+                continue
+            removed += 1
+    return {"status": "completed", "entries_removed": removed}
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List
+import time
+from helpers.state import state_db
+
+# name -> what we last ingested for that blob, so a run only touches blobs whose
+# ETag moved. The chunk keys each source produced live in helpers/key_registry.py.
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blob_manifest (
+            name TEXT PRIMARY KEY,
+            source_url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            size INTEGER,
+            content_hash TEXT,
+            ingested_at REAL
+        )
+        """
+    )
+
+def load_manifest() -> Dict[str, Dict[str, Any]]:
+    with state_db() as db:
+        rows = db.execute("SELECT * FROM blob_manifest").fetchall()
+    return {row["name"]: dict(row) for row in rows}
+
+def diff_manifest(listing: List[Dict[str, Any]], manifest: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    added: List[Dict[str, Any]] = []
+    changed: List[Dict[str, Any]] = []
+    unchanged: List[Dict[str, Any]] = []
+    seen = set()
+
+    for entry in listing:
+        seen.add(entry["name"])
+        prev = manifest.get(entry["name"])
+        if prev is None:
+            added.append(entry)
+        elif prev["etag"] != entry["etag"] or prev["last_modified"] != entry["last_modified"]:
+            changed.append(entry)
+        else:
+            unchanged.append(entry)
+
+    deleted = [prev for name, prev in manifest.items() if name not in seen]
+    return {"added": added, "changed": changed, "unchanged": unchanged, "deleted": deleted}
+
+def record_blob(entry: Dict[str, Any], content_hash: str):
+    with state_db() as db:
+        db.execute(
+            """
+            INSERT OR REPLACE INTO blob_manifest
+                (name, source_url, etag, last_modified, size, content_hash, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                entry["name"],
+                entry["source_url"],
+                entry.get("etag"),
+                entry.get("last_modified"),
+                entry.get("size"),
+                content_hash,
+                time.time(),
+            ),
+        )
+
+def touch_blob(entry: Dict[str, Any]):
+    # Same bytes under a new ETag (e.g. re-upload of an identical file)
+    with state_db() as db:
+        db.execute(
+            "UPDATE blob_manifest SET etag = ?, last_modified = ?, size = ? WHERE name = ?",
+            (entry.get("etag"), entry.get("last_modified"), entry.get("size"), entry["name"]),
+        )
+
+def remove_blob(name: str):
+    with state_db() as db:
+        db.execute("DELETE FROM blob_manifest WHERE name = ?", (name,))
+
+def forget_sources(source_urls: List[str]):
+    # The next run treats these blobs as new
+    with state_db() as db:
+        db.executemany("DELETE FROM blob_manifest WHERE source_url = ?", [(su,) for su in source_urls])
+
+def clear_manifest():
+    with state_db() as db:
+        db.execute("DELETE FROM blob_manifest")
+
+def restore_manifest(rows: List[Dict[str, Any]]):
+    # Rows as returned by load_manifest(), e.g. from an index snapshot
+    with state_db() as db:
+        db.executemany(
+            """
+            INSERT OR REPLACE INTO blob_manifest
+                (name, source_url, etag, last_modified, size, content_hash, ingested_at)
+            VALUES (:name, :source_url, :etag, :last_modified, :size, :content_hash, :ingested_at)
+            """,
+            rows,
+        )
@@ -0,0 +1,256 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from array import array
+from functools import lru_cache
+from dotenv import load_dotenv
+import hashlib
+import os
+import random
+import threading
+from helpers.embedding_cache import normalize_text
+from helpers.state import state_db
+import helpers.key_registry  # creates chunk_key_registry, which the lookups below join
+
+load_dotenv()
+
+NEAR_DUP_THRESHOLD = os.getenv("NEAR_DUP_THRESHOLD", "0")
+NEAR_DUP_NUM_PERM = os.getenv("NEAR_DUP_NUM_PERM", "128")
+NEAR_DUP_SHINGLE_WORDS = os.getenv("NEAR_DUP_SHINGLE_WORDS", "5")
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = 0xFFFFFFFF
+PERM_SEED = 1
+
+# MinHash signatures of the canonical chunks in the index, bucketed by LSH band so a
+# new chunk is only compared with chunks that share at least one band. Chunks from other
+# sources whose estimated Jaccard similarity reaches NEAR_DUP_THRESHOLD are not indexed;
+# chunk_aliases records which canonical chunk stands in for them.
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS near_dup_signatures (
+            key TEXT PRIMARY KEY,
+            source_url TEXT NOT NULL,
+            signature BLOB NOT NULL
+        )
+        """
+    )
+    _db.execute("CREATE INDEX IF NOT EXISTS near_dup_signatures_source ON near_dup_signatures (source_url)")
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS near_dup_buckets (
+            band INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            key TEXT NOT NULL
+        )
+        """
+    )
+    _db.execute("CREATE INDEX IF NOT EXISTS near_dup_buckets_band ON near_dup_buckets (band, bucket)")
+    _db.execute("CREATE INDEX IF NOT EXISTS near_dup_buckets_key ON near_dup_buckets (key)")
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chunk_aliases (
+            alias_key TEXT PRIMARY KEY,
+            source_url TEXT NOT NULL,
+            canonical_key TEXT NOT NULL
+        )
+        """
+    )
+    _db.execute("CREATE INDEX IF NOT EXISTS chunk_aliases_source ON chunk_aliases (source_url)")
+    _db.execute("CREATE INDEX IF NOT EXISTS chunk_aliases_canonical ON chunk_aliases (canonical_key)")
+
+# Fixed seed: signatures must stay comparable across runs and processes
+_rng = random.Random(PERM_SEED)
+_perms = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(int(NEAR_DUP_NUM_PERM))]
+
+def near_dupes_enabled() -> bool:
+    return float(NEAR_DUP_THRESHOLD) > 0
+
+def _shingles(text: str, k: int) -> Set[str]:
+    words = normalize_text(text).lower().split(" ")
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def minhash_signature(text: str) -> array:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in _shingles(text, int(NEAR_DUP_SHINGLE_WORDS))
+    ]
+    return array("I", (min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in _perms))
+
+def estimate_similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    # (bands, rows) with the smallest combined false positive / false negative area
+    # under the LSH S-curve, as in datasketch
+    def area(f, lo: float, hi: float, steps: int = 200) -> float:
+        step = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * step) for i in range(steps)) * step
+
+    best: Optional[Tuple[float, int, int]] = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        fp = area(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        fn = area(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        if best is None or fp + fn < best[0]:
+            best = (fp + fn, bands, rows)
+    return best[1], best[2]
+
+def _band_buckets(signature: array) -> List[Tuple[int, str]]:
+    bands, rows = lsh_params(float(NEAR_DUP_THRESHOLD), len(signature))
+    return [
+        (band, hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest())
+        for band in range(bands)
+    ]
+
+class PendingSignatures:
+    # Canonical chunks accepted earlier in this run. Their signatures only reach
+    # near_dup_signatures once their upload has finished, so a copy arriving right behind
+    # them is checked against this set as well. Entries are dropped after the upload.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[int, str], Set[str]] = {}
+        self._entries: Dict[str, Tuple[str, array, List[Tuple[int, str]]]] = {}
+
+    def add(self, key: str, source_url: str, signature: array):
+        buckets = _band_buckets(signature)
+        with self._lock:
+            self._entries[key] = (source_url, signature, buckets)
+            for bb in buckets:
+                self._buckets.setdefault(bb, set()).add(key)
+
+    def discard(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is None:
+                    continue
+                for bb in entry[2]:
+                    members = self._buckets.get(bb)
+                    if members is not None:
+                        members.discard(key)
+                        if not members:
+                            del self._buckets[bb]
+
+    def candidates(self, buckets: List[Tuple[int, str]]) -> List[Tuple[str, str, array]]:
+        with self._lock:
+            keys = set().union(*(self._buckets.get(bb, ()) for bb in buckets))
+            return [(k, self._entries[k][0], self._entries[k][1]) for k in keys]
+
+def find_near_duplicates(
+    chunks: List[Dict[str, Any]],
+    signatures: Dict[str, array],
+    pending: Optional[PendingSignatures] = None,
+) -> Dict[str, str]:
+    # alias key -> canonical key, for chunks that nearly duplicate an indexed chunk of
+    # another source, a chunk accepted earlier in this run (`pending`), or an earlier
+    # chunk of the same document. Chunks that are kept are added to `pending`.
+    threshold = float(NEAR_DUP_THRESHOLD)
+    aliases: Dict[str, str] = {}
+    local = PendingSignatures()
+    with state_db() as db:
+        for c in chunks:
+            sig = signatures[c["id"]]
+            buckets = _band_buckets(sig)
+            rows = db.execute(
+                f"""
+                SELECT DISTINCT s.key, s.signature FROM near_dup_buckets b
+                JOIN near_dup_signatures s ON s.key = b.key
+                JOIN chunk_key_registry r ON r.key = b.key
+                WHERE (b.band, b.bucket) IN (VALUES {', '.join(['(?, ?)'] * len(buckets))}) AND s.source_url != ?
+                """,
+                [*(v for bb in buckets for v in bb), c["source_url"]],
+            ).fetchall()
+            candidates = [(r["key"], array("I", r["signature"])) for r in rows]
+            if pending is not None:
+                candidates += [(k, other) for k, src, other in pending.candidates(buckets) if src != c["source_url"]]
+            candidates += [(k, other) for k, _, other in local.candidates(buckets)]
+
+            best_key, best_sim = None, threshold
+            for key, other in candidates:
+                sim = estimate_similarity(sig, other)
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+            if best_key:
+                aliases[c["id"]] = best_key
+            else:
+                local.add(c["id"], c["source_url"], sig)
+
+    if pending is not None:
+        for c in chunks:
+            if c["id"] not in aliases:
+                pending.add(c["id"], c["source_url"], signatures[c["id"]])
+    return aliases
+
+def forget_source(source_url: str):
+    with state_db() as db:
+        db.execute(
+            "DELETE FROM near_dup_buckets WHERE key IN (SELECT key FROM near_dup_signatures WHERE source_url = ?)",
+            (source_url,),
+        )
+        db.execute("DELETE FROM near_dup_signatures WHERE source_url = ?", (source_url,))
+
+def record_signatures(source_url: str, signatures: Dict[str, array]):
+    # Replaces what was recorded for the source; only canonical (indexed) chunks belong here
+    forget_source(source_url)
+    with state_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO near_dup_signatures (key, source_url, signature) VALUES (?, ?, ?)",
+            [(k, source_url, sig.tobytes()) for k, sig in signatures.items()],
+        )
+        db.executemany(
+            "INSERT INTO near_dup_buckets (band, bucket, key) VALUES (?, ?, ?)",
+            [(band, bucket, k) for k, sig in signatures.items() for band, bucket in _band_buckets(sig)],
+        )
+
+def set_aliases(source_url: str, aliases: Dict[str, str]) -> Set[str]:
+    # Replaces the source's aliases; returns every canonical key whose alias list changed
+    with state_db() as db:
+        old = {r["canonical_key"] for r in db.execute(
+            "SELECT canonical_key FROM chunk_aliases WHERE source_url = ?", (source_url,)
+        ).fetchall()}
+        db.execute("DELETE FROM chunk_aliases WHERE source_url = ?", (source_url,))
+        db.executemany(
+            "INSERT OR REPLACE INTO chunk_aliases (alias_key, source_url, canonical_key) VALUES (?, ?, ?)",
+            [(alias, source_url, canonical) for alias, canonical in aliases.items()],
+        )
+    return old | set(aliases.values())
+
+def alias_sources_for(canonical_keys: Iterable[str]) -> Dict[str, List[str]]:
+    # Only canonical keys that are still indexed; the others have nothing to update
+    keys = list(canonical_keys)
+    out: Dict[str, List[str]] = {}
+    with state_db() as db:
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            for r in db.execute(
+                f"SELECT key FROM chunk_key_registry WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall():
+                out[r["key"]] = []
+            rows = db.execute(
+                f"SELECT DISTINCT canonical_key, source_url FROM chunk_aliases WHERE canonical_key IN ({','.join('?' * len(part))}) ORDER BY source_url",
+                part,
+            ).fetchall()
+            for r in rows:
+                if r["canonical_key"] in out:
+                    out[r["canonical_key"]].append(r["source_url"])
+    return out
+
+def orphaned_alias_sources() -> List[str]:
+    # Sources whose canonical chunk left the index: their content is no longer searchable,
+    # so they have to be ingested again
+    with state_db() as db:
+        rows = db.execute(
+            """
+            SELECT DISTINCT source_url FROM chunk_aliases
+            WHERE canonical_key NOT IN (SELECT key FROM chunk_key_registry)
+            """
+        ).fetchall()
+        sources = [r["source_url"] for r in rows]
+        db.executemany("DELETE FROM chunk_aliases WHERE source_url = ?", [(s,) for s in sources])
+    return sources
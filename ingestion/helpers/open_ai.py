@@ -1,8 +1,16 @@
 from dotenv import load_dotenv
 import os
-from openai import AzureOpenAI
+import re
+import asyncio
+from openai import AsyncAzureOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from helpers.prompts import TABLE_SUMMARY_SYSTEM_PROMPT
-from typing import List, Dict, Any
+from helpers.embedding_cache import text_hash, get_cached_embeddings, put_cached_embeddings
+from helpers.aio import run_coroutine
+from helpers.rate_limit import AdaptiveRateLimiter, retry_after_seconds
+from helpers.table_summary_cache import table_hash, get_cached_summaries, put_cached_summaries
+from helpers.tokens import count_tokens_batch
+from helpers.common import EMBEDDING_DIMENSIONS
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 
 load_dotenv()
 
@@ -11,45 +19,253 @@ OAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 OAI_EMBED_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 OAI_MODEL_DEPLOYMENT = os.getenv("AZURE_OPENAI_MODEL_DEPLOYMENT")
 EMBEDDING_BATCH_SIZE = os.getenv("EMBEDDING_BATCH_SIZE")
+EMBEDDING_MAX_BATCH_TOKENS = os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "100000")
+EMBEDDING_MAX_CONCURRENCY = os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")
+EMBEDDING_TOKENS_PER_MINUTE = os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "0")
+OAI_MAX_RETRIES = os.getenv("OAI_MAX_RETRIES", "8")
+CHAT_TOKENS_PER_MINUTE = os.getenv("CHAT_TOKENS_PER_MINUTE", "0")
+TABLE_SUMMARY_CONCURRENCY = os.getenv("TABLE_SUMMARY_CONCURRENCY", "4")
+TABLE_SUMMARY_PACK_SIZE = os.getenv("TABLE_SUMMARY_PACK_SIZE", "1")
+TABLE_SUMMARY_PACK_MAX_CHARS = os.getenv("TABLE_SUMMARY_PACK_MAX_CHARS", "1500")
 
-oai_client = AzureOpenAI(
-    azure_endpoint=OAI_ENDPOINT,
-    api_key=OAI_KEY,
-    api_version="2024-10-21",
-)
+TABLE_MARKER = re.compile(r"^#+\s*TABLE\s+(\d+)\s*:?$", re.IGNORECASE)
 
-def summarize_table_text_via_llm(table_text: str) -> str:
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Async client and limiter live on the shared background loop (see helpers/aio.py).
+# Retries are handled here so 429s can feed the limiter instead of the SDK's backoff.
+_async_oai_client: Optional[AsyncAzureOpenAI] = None
+_embedding_limiter: Optional[AdaptiveRateLimiter] = None
+_summary_limiter: Optional[AdaptiveRateLimiter] = None
+
+def _get_async_client() -> AsyncAzureOpenAI:
+    global _async_oai_client
+    if _async_oai_client is None:
+        _async_oai_client = AsyncAzureOpenAI(
+            azure_endpoint=OAI_ENDPOINT,
+            api_key=OAI_KEY,
+            api_version="2024-10-21",
+            max_retries=0,
+        )
+    return _async_oai_client
+
+def _get_summary_limiter() -> AdaptiveRateLimiter:
+    global _summary_limiter
+    if _summary_limiter is None:
+        _summary_limiter = AdaptiveRateLimiter(
+            tokens_per_minute=int(CHAT_TOKENS_PER_MINUTE),
+            max_concurrency=int(TABLE_SUMMARY_CONCURRENCY),
+        )
+    return _summary_limiter
+
+def _get_embedding_limiter() -> AdaptiveRateLimiter:
+    global _embedding_limiter
+    if _embedding_limiter is None:
+        _embedding_limiter = AdaptiveRateLimiter(
+            tokens_per_minute=int(EMBEDDING_TOKENS_PER_MINUTE),
+            max_concurrency=int(EMBEDDING_MAX_CONCURRENCY),
+        )
+    return _embedding_limiter
+
+def pack_batches_by_tokens(token_counts: List[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    # Greedy, order-preserving packing; a text larger than the budget goes alone
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, n in enumerate(token_counts):
+        if current and (current_tokens + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+async def _call_with_limiter(limiter: AdaptiveRateLimiter, tokens: int, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    for attempt in range(int(OAI_MAX_RETRIES) + 1):
+        await limiter.acquire(tokens)
+        try:
+            resp = await make_call()
+        except RETRYABLE_ERRORS as e:
+            throttled = isinstance(e, RateLimitError)
+            await limiter.release(throttled=throttled, retry_after=retry_after_seconds(e, 2 ** attempt), failed=not throttled)
+            if attempt >= int(OAI_MAX_RETRIES):
+                raise
+            if not throttled:
+                await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        except BaseException:
+            await limiter.release(failed=True)
+            raise
+
+        await limiter.release()
+        return resp
+
+def embedding_options() -> Dict[str, Any]:
+    return {"dimensions": int(EMBEDDING_DIMENSIONS)} if EMBEDDING_DIMENSIONS else {}
+
+def embedding_cache_namespace() -> str:
+    # Vectors of different sizes from the same deployment must not share cache entries
+    return f"{OAI_EMBED_DEPLOYMENT}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else OAI_EMBED_DEPLOYMENT
+
+async def _embed_batch_async(texts: List[str], tokens: int) -> List[List[float]]:
+    client = _get_async_client()
+    resp = await _call_with_limiter(
+        _get_embedding_limiter(),
+        tokens,
+        lambda: client.embeddings.create(model=OAI_EMBED_DEPLOYMENT, input=texts, **embedding_options()),
+    )
+    # resp.data is in the same order as `texts`
+    return [item.embedding for item in resp.data]
+
+async def embed_texts_async(texts: List[str]) -> List[List[float]]:
+    token_counts = count_tokens_batch(texts)
+    batches = pack_batches_by_tokens(token_counts, int(EMBEDDING_MAX_BATCH_TOKENS), int(EMBEDDING_BATCH_SIZE))
+
+    results = await asyncio.gather(*[
+        _embed_batch_async([texts[i] for i in batch], sum(token_counts[i] for i in batch))
+        for batch in batches
+    ])
+
+    embeddings: List[List[float]] = [[] for _ in texts]
+    for batch, vectors in zip(batches, results):
+        for i, vec in zip(batch, vectors):
+            embeddings[i] = vec
+    return embeddings
+
+async def _summarize_async(user_prompt: str) -> str:
+    client = _get_async_client()
+    resp = await _call_with_limiter(
+        _get_summary_limiter(),
+        count_tokens_batch([user_prompt])[0],
+        lambda: client.chat.completions.create(
+            model=OAI_MODEL_DEPLOYMENT,
+            temperature=0,
+            messages=[
+                {"role": "system", "content": TABLE_SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+        ),
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+async def _summarize_one_async(table_text: str) -> str:
     user_prompt = f"""Convert the following table into structured descriptive sentences.
 
 Table:
 {table_text}
 """
-    resp = oai_client.chat.completions.create(
-        model=OAI_MODEL_DEPLOYMENT,
-        temperature=0,
-        messages=[
-            {"role": "system", "content": TABLE_SUMMARY_SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-    )
-    return (resp.choices[0].message.content or "").strip()
+    return await _summarize_async(user_prompt)
+
+def split_packed_summaries(content: str, count: int) -> Optional[List[str]]:
+    # Returns None unless every table marker 1..count is present exactly once
+    parts: Dict[int, List[str]] = {}
+    current: Optional[int] = None
+    for line in content.splitlines():
+        m = TABLE_MARKER.match(line.strip())
+        if m:
+            current = int(m.group(1))
+            if current in parts:
+                return None
+            parts[current] = []
+            continue
+        if current is not None:
+            parts[current].append(line)
+
+    if sorted(parts) != list(range(1, count + 1)):
+        return None
+    summaries = ["\n".join(parts[i]).strip() for i in range(1, count + 1)]
+    if not all(summaries):
+        return None
+    return summaries
+
+async def _summarize_packed_async(tables: List[str]) -> List[str]:
+    if len(tables) == 1:
+        return [await _summarize_one_async(tables[0])]
+
+    sections = "\n\n".join(f"### TABLE {i}\n{t}" for i, t in enumerate(tables, 1))
+    user_prompt = f"""Convert each of the following {len(tables)} tables into structured descriptive sentences.
+Convert every table independently. Start the output for each table with its marker line exactly as given
+(for example "### TABLE 1") and output nothing else outside the table sections.
+
+{sections}
+"""
+    summaries = split_packed_summaries(await _summarize_async(user_prompt), len(tables))
+    if summaries is None:
+        # The model did not keep the markers; fall back to one call per table
+        return list(await asyncio.gather(*[_summarize_one_async(t) for t in tables]))
+    return summaries
+
+def pack_small_tables(tables: List[str], max_chars: int, max_tables: int) -> List[List[int]]:
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_chars = 0
+    for i, t in enumerate(tables):
+        if max_tables <= 1 or len(t) > max_chars:
+            groups.append([i])
+            continue
+        if current and (current_chars + len(t) > max_chars or len(current) >= max_tables):
+            groups.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += len(t)
+    if current:
+        groups.append(current)
+    return groups
+
+async def summarize_tables_async(tables: List[str]) -> List[str]:
+    groups = pack_small_tables(tables, int(TABLE_SUMMARY_PACK_MAX_CHARS), int(TABLE_SUMMARY_PACK_SIZE))
+    results = await asyncio.gather(*[_summarize_packed_async([tables[i] for i in g]) for g in groups])
+
+    summaries: List[str] = ["" for _ in tables]
+    for group, group_summaries in zip(groups, results):
+        for i, summary in zip(group, group_summaries):
+            summaries[i] = summary
+    return summaries
+
+def summarize_tables(tables: List[str]) -> List[str]:
+    # Identical tables share one summary, within the call and across runs
+    hashes = [table_hash(t) for t in tables]
+    summaries = get_cached_summaries(OAI_MODEL_DEPLOYMENT, hashes)
+
+    pending: Dict[str, str] = {}
+    for h, t in zip(hashes, tables):
+        if h not in summaries and h not in pending:
+            pending[h] = t
+
+    if pending:
+        pending_hashes = list(pending)
+        generated = run_coroutine(summarize_tables_async([pending[h] for h in pending_hashes]))
+        new_summaries = {h: s for h, s in zip(pending_hashes, generated) if s}
+        put_cached_summaries(OAI_MODEL_DEPLOYMENT, new_summaries)
+        summaries.update(new_summaries)
+
+    return [summaries.get(h, "") for h in hashes]
 
 def embed_texts_batch(texts: List[str]) -> List[List[float]]:
 
-    embeddings: List[List[float]] = []
+    # Identical texts (after whitespace normalization) share one vector, both within
+    # this call and across runs through the on-disk cache
+    hashes = [text_hash(t) for t in texts]
+    vectors = get_cached_embeddings(embedding_cache_namespace(), hashes)
 
-    for start in range(0, len(texts), int(EMBEDDING_BATCH_SIZE)):
-        batch = texts[start : start + int(EMBEDDING_BATCH_SIZE)]
+    pending: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in vectors and h not in pending:
+            pending[h] = t
 
-        resp = oai_client.embeddings.create(
-            model=OAI_EMBED_DEPLOYMENT,
-            input=batch,
-        )
+    pending_hashes = list(pending)
+    new_vectors: Dict[str, List[float]] = {}
 
-        # resp.data is in the same order as `batch`
-        embeddings.extend([item.embedding for item in resp.data])
+    if pending_hashes:
+        embedded = run_coroutine(embed_texts_async([pending[h] for h in pending_hashes]))
+        new_vectors = dict(zip(pending_hashes, embedded))
 
-    return embeddings
+    put_cached_embeddings(embedding_cache_namespace(), new_vectors)
+    vectors.update(new_vectors)
+
+    return [vectors[h] for h in hashes]
 
 def add_embeddings_to_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
@@ -0,0 +1,362 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+import os
+import queue
+import threading
+from helpers.blob import list_blob_entries, iter_blobs, too_large, BLOB_MAX_BYTES
+from helpers.chunking import analyze_file, chunks_from_layout
+from helpers.chunk_worker import PARSE_WORKERS
+from helpers.document_intelligence import DI_MAX_CONCURRENT_DOCUMENTS
+from helpers.document_parser import slim_layout
+from helpers.open_ai import add_embeddings_to_chunks
+from helpers.manifest import load_manifest, diff_manifest, record_blob, touch_blob, remove_blob, forget_sources
+from helpers.search import index_document_count, delete_keys_in_batches, sync_chunks, reconcile_key_registry, set_alias_sources
+from helpers.near_dupes import (
+    PendingSignatures,
+    near_dupes_enabled,
+    minhash_signature,
+    find_near_duplicates,
+    record_signatures,
+    forget_source,
+    set_aliases,
+    alias_sources_for,
+    orphaned_alias_sources,
+)
+from helpers.key_registry import keys_for_source, registry_stats
+
+load_dotenv()
+
+PIPELINE_QUEUE_SIZE = os.getenv("PIPELINE_QUEUE_SIZE", "4")
+
+# A stage is (name, fn, workers). fn takes one item and returns the item for the
+# next stage, or None to drop it.
+Stage = Tuple[str, Callable[[Any], Optional[Any]], int]
+
+_DONE = object()
+_POLL_SECONDS = 0.5
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: List[Stage],
+    queue_size: int,
+    stop: Optional[threading.Event] = None,
+    on_progress: Optional[Callable[[str, Any], None]] = None,
+    source_name: str = "download",
+    discard: Optional[Callable[[Any], None]] = None,
+) -> Dict[str, Any]:
+    # One bounded queue in front of every stage; the source thread feeds the first one.
+    # At most ~queue_size items wait between two stages, so memory tracks the in-flight
+    # window rather than the size of `source`. Setting `stop` from outside cancels the
+    # run: workers finish the item in hand and exit. Items left behind by a cancel or an
+    # error are handed to `discard` so they can release what they hold.
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stop = stop or threading.Event()
+    lock = threading.Lock()
+    errors: List[BaseException] = []
+    processed = {name: 0 for name, _, _ in stages}
+    processed[source_name] = 0
+    finished_workers = [0 for _ in stages]
+    drained = threading.Event()
+
+    def fail(e: BaseException):
+        with lock:
+            errors.append(e)
+        stop.set()
+
+    def close_stage(i: int):
+        # The last worker of stage i to finish tells every worker of stage i+1 to stop.
+        if i + 1 >= len(stages):
+            return
+        for _ in range(stages[i + 1][2]):
+            _put(queues[i + 1], _DONE, stop)
+
+    def drop(item: Any):
+        if discard and item is not None and item is not _DONE:
+            discard(item)
+
+    def feed():
+        try:
+            for item in source:
+                with lock:
+                    processed[source_name] += 1
+                if on_progress:
+                    on_progress(source_name, item)
+                if not _put(queues[0], item, stop):
+                    drop(item)
+                    break
+        except BaseException as e:
+            fail(e)
+        finally:
+            # Lets a generator source clean up whatever it prepared ahead
+            close = getattr(source, "close", None)
+            if close:
+                try:
+                    close()
+                except BaseException as e:
+                    fail(e)
+            for _ in range(stages[0][2]):
+                _put(queues[0], _DONE, stop)
+
+    def work(i: int):
+        name, fn, _ = stages[i]
+        saw_done = False
+        try:
+            while True:
+                item = _get(queues[i], stop)
+                if item is _DONE:
+                    saw_done = not stop.is_set()
+                    break
+                out = fn(item)
+                with lock:
+                    processed[name] += 1
+                if on_progress:
+                    on_progress(name, item)
+                if out is not None and i + 1 < len(stages):
+                    if not _put(queues[i + 1], out, stop):
+                        drop(out)
+                        break
+        except BaseException as e:
+            fail(e)
+        finally:
+            with lock:
+                finished_workers[i] += 1
+                last = finished_workers[i] == stages[i][2]
+            if last:
+                close_stage(i)
+                if i == len(stages) - 1 and saw_done:
+                    drained.set()
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for i, (name, _, workers) in enumerate(stages):
+        for w in range(workers):
+            threads.append(threading.Thread(target=work, args=(i,), name=f"pipeline-{name}-{w}", daemon=True))
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for q in queues:
+        while True:
+            try:
+                drop(q.get_nowait())
+            except queue.Empty:
+                break
+
+    if errors:
+        raise errors[0]
+
+    return {"processed": processed, "cancelled": not drained.is_set()}
+
+
+def iter_changed_blobs(entries: List[Dict[str, Any]], manifest: Dict[str, Dict[str, Any]], full: bool = False):
+    # Blobs arrive as spooled files, already hashed while they streamed in. Closing this
+    # generator closes iter_blobs too, which drops the downloads it ran ahead on.
+    blobs = iter_blobs(entries)
+    try:
+        for doc in blobs:
+            prev = manifest.get(doc["name"])
+            if prev and prev["content_hash"] == doc["content_hash"] and not full:
+                # ETag moved but the bytes did not; nothing to re-index
+                doc.pop("file").close()
+                touch_blob(doc)
+                continue
+            yield doc
+    finally:
+        blobs.close()
+
+
+def discard_blob(doc: Dict[str, Any]):
+    file = doc.pop("file", None)
+    if file is not None:
+        file.close()
+
+
+def layout_stage(doc: Dict[str, Any]) -> Dict[str, Any]:
+    print(f"Analyzing layout for {doc['filename']}....")
+    # Only the slim records cross the queue; the full layout tree and the spooled file
+    # are released here
+    with doc.pop("file") as file:
+        doc["layout"] = slim_layout(analyze_file(doc["filename"], file, doc["content_hash"]))
+    return doc
+
+
+def chunk_stage(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc["chunks"] = chunks_from_layout(doc["filename"], doc.pop("layout"), doc.get("source_url"))
+    doc["existing_keys"] = keys_for_source(doc["source_url"])
+    return doc
+
+
+def suppress_near_duplicates(doc: Dict[str, Any], pending: Optional[PendingSignatures] = None):
+    # Chunks that nearly repeat an indexed chunk of another source, a chunk accepted
+    # earlier in this run, or an earlier chunk of the same document are dropped here and
+    # recorded as aliases of it, so they are neither embedded nor written
+    doc["signatures"] = {c["id"]: minhash_signature(c["chunk"]) for c in doc["chunks"]}
+    doc["aliases"] = find_near_duplicates(doc["chunks"], doc["signatures"], pending)
+    if doc["aliases"]:
+        print(f"{doc['filename']}: {len(doc['aliases'])} near-duplicate chunks folded into existing ones....")
+        doc["chunks"] = [c for c in doc["chunks"] if c["id"] not in doc["aliases"]]
+
+
+def make_embed_stage(pending: Optional[PendingSignatures] = None) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    def embed_stage(doc: Dict[str, Any]) -> Dict[str, Any]:
+        if near_dupes_enabled():
+            suppress_near_duplicates(doc, pending)
+
+        # Chunks whose content-derived key is already indexed need neither an embedding nor a write
+        existing = set(doc["existing_keys"])
+        add_embeddings_to_chunks([c for c in doc["chunks"] if c["id"] not in existing])
+        return doc
+
+    return embed_stage
+
+
+def make_upload_stage(results: List[Dict[str, Any]], pending: Optional[PendingSignatures] = None) -> Callable[[Dict[str, Any]], None]:
+    def upload_stage(doc: Dict[str, Any]) -> None:
+        chunks = doc.pop("chunks")
+        response = sync_chunks(chunks, doc["existing_keys"])
+        doc["upload_failed"] = response["failed"]
+        if response["failed"]:
+            # Leave the manifest alone so the next run picks this blob up again
+            print(f"{doc['filename']}: {response['failed']} chunks failed to upload, will retry on next run....")
+        else:
+            record_blob(doc, doc["content_hash"])
+            aliases = doc.get("aliases", {})
+            record_signatures(doc["source_url"], {k: v for k, v in doc.get("signatures", {}).items() if k not in aliases})
+            update_alias_sources(set_aliases(doc["source_url"], aliases))
+            requeue_orphaned_aliases()
+        if pending is not None:
+            # Recorded in near_dup_signatures now, or not indexed at all
+            pending.discard(doc.get("signatures", {}))
+        print(f"{doc['filename']}: written={response['written']} deleted={response['deleted']} unchanged={response['unchanged']}")
+        results.append({"name": doc["name"], "aliased": len(doc.get("aliases", {})), **response})
+        return None
+
+    return upload_stage
+
+
+def update_alias_sources(canonical_keys):
+    if not canonical_keys:
+        return
+    report = set_alias_sources(alias_sources_for(canonical_keys))
+    if report["failed"]:
+        print(f"alias_sources update failed for {report['failed']} chunks (is the field in the index? POST /create-index adds it)....")
+
+
+def requeue_orphaned_aliases() -> List[str]:
+    # Aliases whose canonical chunk left the index must be ingested again themselves
+    sources = orphaned_alias_sources()
+    if sources:
+        print(f"{len(sources)} sources lost their canonical chunks, re-ingesting them....")
+        forget_sources(sources)
+    return sources
+
+
+def remove_deleted_blobs(deleted: List[Dict[str, Any]]):
+    for prev in deleted:
+        keys = keys_for_source(prev["source_url"])
+        if keys:
+            print(f"Deleting chunks for removed blob {prev['name']}....")
+            delete_keys_in_batches(keys)
+        forget_source(prev["source_url"])
+        update_alias_sources(set_aliases(prev["source_url"], {}))
+        remove_blob(prev["name"])
+
+
+def ingest_blobs(
+    full: bool = False,
+    stop: Optional[threading.Event] = None,
+    on_start: Optional[Callable[[int], None]] = None,
+    on_progress: Optional[Callable[[str, Any], None]] = None,
+    skip: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
+    # skip: blob names a resumed job already uploaded
+    listing = list_blob_entries()
+    manifest = load_manifest()
+    diff = diff_manifest(listing, manifest)
+
+    if not registry_stats()["keys"] and index_document_count() > 0:
+        # Chunks were indexed before the key registry existed (with or without a
+        # manifest); seed it from the index once so their old keys get replaced
+        print("Key registry is empty, seeding it from the index....")
+        reconcile_key_registry(repair=True)
+
+    if full:
+        # Re-process everything; the key registry still drives the sync step
+        to_process = listing
+    else:
+        to_process = diff["added"] + diff["changed"]
+
+    print(
+        f"Blobs: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+        f"{len(diff['unchanged'])} unchanged, {len(diff['deleted'])} deleted...."
+    )
+    remove_deleted_blobs(diff["deleted"])
+
+    requeued = set(requeue_orphaned_aliases())
+    if requeued:
+        manifest = {name: m for name, m in manifest.items() if m["source_url"] not in requeued}
+        queued = {e["name"] for e in to_process}
+        to_process = to_process + [e for e in listing if e["source_url"] in requeued and e["name"] not in queued]
+
+    if skip:
+        to_process = [e for e in to_process if e["name"] not in skip]
+
+    # Oversized blobs are left out of this run and keep whatever chunks they had
+    skipped = [e for e in to_process if too_large(e)]
+    if skipped:
+        print(f"Skipping {len(skipped)} blobs larger than BLOB_MAX_BYTES ({BLOB_MAX_BYTES})....")
+        to_process = [e for e in to_process if not too_large(e)]
+
+    results: List[Dict[str, Any]] = []
+    pending = PendingSignatures()
+    stages: List[Stage] = [
+        ("layout", layout_stage, int(DI_MAX_CONCURRENT_DOCUMENTS)),
+        ("chunk", chunk_stage, max(1, int(PARSE_WORKERS))),
+        ("embed", make_embed_stage(pending), 1),
+        ("upload", make_upload_stage(results, pending), 1),
+    ]
+
+    if on_start:
+        on_start(len(to_process))
+
+    source = iter_changed_blobs(to_process, manifest, full=full)
+    stats = run_pipeline(source, stages, queue_size=int(PIPELINE_QUEUE_SIZE), stop=stop, on_progress=on_progress, discard=discard_blob)
+
+    return {
+        "status": "cancelled" if stats["cancelled"] else "completed",
+        "documents_added": len(diff["added"]),
+        "documents_changed": len(diff["changed"]),
+        "documents_unchanged": len(diff["unchanged"]),
+        "documents_deleted": len(diff["deleted"]),
+        "documents_skipped": len(skipped),
+        "documents_synced": len(results),
+        "chunks_written": sum(r["written"] for r in results),
+        "chunks_deleted": sum(r["deleted"] for r in results),
+        "chunks_unchanged": sum(r["unchanged"] for r in results),
+        "chunks_failed": sum(r["failed"] for r in results),
+        "chunks_aliased": sum(r["aliased"] for r in results),
+        "skipped": [e["name"] for e in skipped][:100],
+        "failures": [{"name": r["name"], **f} for r in results if r["upload"] for f in r["upload"]["failures"]][:100],
+        "stages": stats["processed"],
+    }
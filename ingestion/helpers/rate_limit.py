@@ -0,0 +1,78 @@
+from typing import Optional
+import asyncio
+import time
+
+class AdaptiveRateLimiter:
+    # Token bucket for a tokens-per-minute quota plus an AIMD concurrency window:
+    # every 429 halves the window and pauses all callers for Retry-After, and a full
+    # window of successes grows it by one again up to `max_concurrency`. Other
+    # failures (5xx, timeouts) free their slot without counting as a success.
+
+    def __init__(self, tokens_per_minute: int, max_concurrency: int):
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.blocked_until = 0.0
+        self.cond = asyncio.Condition()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        async with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                need = min(float(tokens), self.capacity)
+
+                if now < self.blocked_until:
+                    wait: Optional[float] = self.blocked_until - now
+                elif self.in_flight >= self.concurrency:
+                    wait = None
+                elif self.rate > 0 and self.tokens < need:
+                    wait = (need - self.tokens) / self.rate
+                else:
+                    if self.rate > 0:
+                        self.tokens -= need
+                    self.in_flight += 1
+                    return
+
+                try:
+                    await asyncio.wait_for(self.cond.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, throttled: bool = False, retry_after: Optional[float] = None, failed: bool = False):
+        async with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.concurrency = max(1, self.concurrency // 2)
+                self.successes = 0
+                self.tokens = 0.0
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            elif not failed:
+                self.successes += 1
+                if self.successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+def retry_after_seconds(error: Exception, default: float) -> float:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return default
@@ -2,9 +2,15 @@ from dotenv import load_dotenv
 import os
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
-from typing import List, Dict, Any
-from helpers.common import batched, build_source_url_filter, build_index_payload
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from helpers.common import batched, build_index_payload
+from helpers.key_registry import keys_in_range, register_keys, unregister_keys, clear_registry
+from helpers.index_version import bump_index_version
 import httpx
+import json
+import time
 
 load_dotenv()
 
@@ -12,7 +18,20 @@ SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 SEARCH_KEY = os.getenv("AZURE_SEARCH_ADMIN_KEY")
 INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX")
 SEARCH_BATCH_SIZE = os.getenv("SEARCH_BATCH_SIZE")
-SEARCH_FILTER_BATCH_SIZE = os.getenv("SEARCH_FILTER_BATCH_SIZE")
+SEARCH_MAX_BATCH_BYTES = os.getenv("SEARCH_MAX_BATCH_BYTES", str(8 * 1024 * 1024))
+SEARCH_UPLOAD_CONCURRENCY = os.getenv("SEARCH_UPLOAD_CONCURRENCY", "4")
+SEARCH_UPLOAD_MAX_RETRIES = os.getenv("SEARCH_UPLOAD_MAX_RETRIES", "5")
+CLEAR_CONCURRENCY = os.getenv("CLEAR_CONCURRENCY", "8")
+CLEAR_PARTITION_TIMEOUT_SECONDS = os.getenv("CLEAR_PARTITION_TIMEOUT_SECONDS", "600")
+
+SEARCH_API_VERSION = "2024-07-01"
+KEY_RANGE_BOUNDARIES = "0123456789abcdef"
+# Two-character prefixes keep every reconcile partition well under the service's skip limit
+RECONCILE_BOUNDARIES = [f"{i:02x}" for i in range(256)]
+CLEAR_MAX_STALLS = 5
+
+# Per-document and per-request statuses worth retrying (throttled / busy / unavailable)
+RETRYABLE_STATUS_CODES = {409, 422, 429, 500, 502, 503, 504}
 
 KEY_FIELD = "id"
 
@@ -22,93 +41,315 @@ search_client = SearchClient(
     credential=AzureKeyCredential(SEARCH_KEY)
 )
 
-def fetch_keys_for_existing_source_urls(source_urls: List[str], page_size: int = 1000) -> List[str]:
-    
-    keys: List[str] = []
+def delete_keys_in_batches(keys: List[str]):
+    total = 0
+    try:
+        for batch_keys in batched(keys, int(SEARCH_BATCH_SIZE)):
+            docs = [{KEY_FIELD: k} for k in batch_keys]
 
-    for su_batch in batched(source_urls, int(SEARCH_FILTER_BATCH_SIZE)):
-        filt = build_source_url_filter(su_batch)
+            result = search_client.delete_documents(documents=docs)
+            unregister_keys(r.key for r in result if r.succeeded)
+            failed = [r for r in result if not r.succeeded]
+            if failed:
+                raise RuntimeError(f"Delete failed for {len(failed)} chunks. First error: {failed[0].error_message}")
 
-        results = search_client.search(
-            search_text="*",
-            filter=filt,
-            select=[KEY_FIELD],
-            top=page_size,
-        )
+            total += len(batch_keys)
+            print(f"Deleted {len(batch_keys)} chunks (total so far: {total})....")
+    finally:
+        # Earlier batches are gone even if a later one failed
+        if keys:
+            bump_index_version("delete")
+        
+def batch_by_size(docs: List[Dict[str, Any]], max_bytes: int, max_count: int) -> List[List[Dict[str, Any]]]:
+    # Each chunk carries its embedding, so a count-only batch can blow the request
+    # payload limit; size batches by their serialized JSON instead
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_bytes = 0
+    for doc in docs:
+        size = len(json.dumps(doc, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        if current and (current_bytes + size > max_bytes or len(current) >= max_count):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(doc)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
 
-        for page in results.by_page():
-            for doc in page:
-                keys.append(doc[KEY_FIELD])
+def _send_batch(batch_no: int, batch: List[Dict[str, Any]], merge: bool, merge_only: bool = False) -> Dict[str, Any]:
+    pending = batch
+    # permanent: rejected for good; failures: the latest round's transient failures,
+    # still pending when the retries run out
+    permanent: List[Dict[str, Any]] = []
+    failures: List[Dict[str, Any]] = []
+    attempts = 0
+    started = time.perf_counter()
+    payload_bytes = len(json.dumps(batch, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
 
-    # de-dupe keys (preserve order)
-    return list(dict.fromkeys(keys))
+    while pending and attempts <= int(SEARCH_UPLOAD_MAX_RETRIES):
+        if attempts:
+            time.sleep(min(2 ** (attempts - 1), 30))
+        attempts += 1
 
-def delete_keys_in_batches(keys: List[str]):
-    for batch_keys in batched(keys, int(SEARCH_BATCH_SIZE)):
-        docs = [{KEY_FIELD: k} for k in batch_keys]
+        try:
+            if merge_only:
+                results = search_client.merge_documents(documents=pending)
+            elif merge:
+                results = search_client.merge_or_upload_documents(documents=pending)
+            else:
+                results = search_client.upload_documents(documents=pending)
+        except (ServiceRequestError, ServiceResponseError) as e:
+            # Connection reset or timeout: the outcome is unknown, so send it all again
+            failures = [{"key": d[KEY_FIELD], "status_code": None, "error": str(e)} for d in pending]
+            continue
+        except HttpResponseError as e:
+            # Whole request rejected; retry it only if the service said so
+            failures = [{"key": d[KEY_FIELD], "status_code": e.status_code, "error": str(e.message)} for d in pending]
+            if e.status_code in RETRYABLE_STATUS_CODES:
+                continue
+            permanent.extend(failures)
+            failures = []
+            break
 
-        result = search_client.delete_documents(documents=docs)
-        failed = [r for r in result if not r.succeeded]
-        if failed:
-            raise RuntimeError(f"Delete failed for {len(failed)} chunks. First error: {failed[0].error_message}")
-        
-        print(f"Deleted {len(batch_keys)} chunks (total so far: {len(batch_keys)})....")
-        
-def upload_chunks_in_batches(chunks: List[Dict[str, Any]]):
-    total_chunks = len(chunks)
-    if total_chunks == 0:
-        return "Uploaded 0 chunks (total 0/0)"
+        # Only the documents that failed with a transient status are sent again
+        by_key = {d[KEY_FIELD]: d for d in pending}
+        failures = []
+        retryable = []
+        for r in results:
+            if r.succeeded:
+                continue
+            failure = {"key": r.key, "status_code": r.status_code, "error": r.error_message}
+            if r.status_code in RETRYABLE_STATUS_CODES:
+                failures.append(failure)
+                retryable.append(by_key[r.key])
+            else:
+                permanent.append(failure)
+        pending = retryable
 
-    uploaded = 0
-    batch_size = int(SEARCH_BATCH_SIZE)
+    failures = permanent + failures
+    return {
+        "batch": batch_no,
+        "documents": len(batch),
+        "bytes": payload_bytes,
+        "attempts": attempts,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "failed": len(failures),
+        "failures": failures,
+    }
 
-    for i in range(0, total_chunks, batch_size):
-        batch = chunks[i:i + batch_size]
-        result = search_client.upload_documents(documents=batch)
+def upload_chunks_in_batches(chunks: List[Dict[str, Any]], merge: bool = False) -> Dict[str, Any]:
+    batches = batch_by_size(chunks, int(SEARCH_MAX_BATCH_BYTES), int(SEARCH_BATCH_SIZE))
 
-        failed = [r for r in result if not r.succeeded]
-        if failed:
-            raise RuntimeError(f"Upload failed for {len(failed)} chunks. First error: {failed[0].error_message}")
+    with ThreadPoolExecutor(max_workers=int(SEARCH_UPLOAD_CONCURRENCY)) as ex:
+        reports = list(ex.map(lambda nb: _send_batch(nb[0], nb[1], merge), enumerate(batches, 1)))
 
-        uploaded += len(batch)
-        print(f"Uploaded {len(batch)} chunks (total {uploaded}/{total_chunks})....")
+    failures = [f for r in reports for f in r["failures"]]
+    failed_keys = {f["key"] for f in failures}
+    register_keys((c[KEY_FIELD], c["source_url"]) for c in chunks if c[KEY_FIELD] not in failed_keys)
+    if len(failures) < len(chunks):
+        bump_index_version("upload")
 
-    return f"Uploaded {uploaded} chunks (total {uploaded}/{total_chunks})"
-    
-def delete_all_chunks_from_index(page_size: int = 1000):
-    results = search_client.search(
-        search_text="*",
-        select=KEY_FIELD,
-    )
+    for r in reports:
+        print(f"Uploaded batch {r['batch']}/{len(batches)}: {r['documents'] - r['failed']}/{r['documents']} chunks, {r['bytes']} bytes, {r['latency_ms']} ms....")
 
-    total_deleted = 0
-    batch = []
+    return {
+        "total": len(chunks),
+        "uploaded": len(chunks) - len(failures),
+        "failed": len(failures),
+        "batches": [{k: v for k, v in r.items() if k != "failures"} for r in reports],
+        "failures": failures,
+    }
 
-    for page in results.by_page():
-        for doc in page:
-            batch.append({KEY_FIELD: doc[KEY_FIELD]})
+def sync_chunks(chunks: List[Dict[str, Any]], existing_keys: List[str]) -> Dict[str, Any]:
+    # Chunk keys are content-derived, so anything already in the index under the same
+    # key is unchanged. Write new chunks first and delete stale keys afterwards so the
+    # document never disappears from the index mid-sync.
+    new_keys = {c[KEY_FIELD] for c in chunks}
+    existing = set(existing_keys)
+    to_write = [c for c in chunks if c[KEY_FIELD] not in existing]
+    stale_keys = [k for k in existing_keys if k not in new_keys]
 
-            if len(batch) >= page_size:
-                search_client.delete_documents(documents=batch)
-                total_deleted += len(batch)
-                batch.clear()
+    report = upload_chunks_in_batches(to_write, merge=True) if to_write else None
+    failed = report["failed"] if report else 0
 
-    # delete remaining
-    if batch:
-        search_client.delete_documents(documents=batch)
-        total_deleted += len(batch)
+    # Keep the old chunks while any new one is missing; the next run retries the document
+    if stale_keys and not failed:
+        delete_keys_in_batches(stale_keys)
 
     return {
-        "status": "completed",
+        "written": len(to_write) - failed,
+        "failed": failed,
+        "deleted": len(stale_keys) if not failed else 0,
+        "unchanged": len(chunks) - len(to_write),
+        "upload": report,
+    }
+
+def set_alias_sources(alias_sources: Dict[str, List[str]]) -> Dict[str, Any]:
+    # Partial merge of alias_sources onto canonical chunks; the rest of each document is
+    # untouched, and a key that is no longer indexed fails instead of being created
+    docs = [{KEY_FIELD: k, "alias_sources": sources} for k, sources in alias_sources.items()]
+    batches = batch_by_size(docs, int(SEARCH_MAX_BATCH_BYTES), int(SEARCH_BATCH_SIZE))
+    reports = [_send_batch(n, b, merge=True, merge_only=True) for n, b in enumerate(batches, 1)]
+    failures = [f for r in reports for f in r["failures"]]
+    return {"total": len(docs), "failed": len(failures), "failures": failures}
+
+def key_ranges(boundaries: Sequence[str] = KEY_RANGE_BOUNDARIES) -> List[Tuple[Optional[str], Optional[str]]]:
+    # Chunk keys are hex digests, so splitting on leading characters gives
+    # independent, roughly even [lo, hi) partitions that together cover every possible key
+    bounds: List[Optional[str]] = [None, *boundaries[1:], None]
+    return list(zip(bounds, bounds[1:]))
+
+def key_range_filter(lo: Optional[str], hi: Optional[str]) -> str:
+    parts = []
+    if lo is not None:
+        parts.append(f"{KEY_FIELD} ge '{lo}'")
+    if hi is not None:
+        parts.append(f"{KEY_FIELD} lt '{hi}'")
+    return " and ".join(parts)
+
+def key_range_filters(boundaries: Sequence[str] = KEY_RANGE_BOUNDARIES) -> List[str]:
+    return [key_range_filter(lo, hi) for lo, hi in key_ranges(boundaries)]
+
+def _delete_partition(filt: str, page_size: int) -> Dict[str, Any]:
+    deleted = set()
+    failures: Dict[str, Dict[str, Any]] = {}
+    stalls = 0
+    deadline = time.monotonic() + float(CLEAR_PARTITION_TIMEOUT_SECONDS)
+
+    # Always read the first page of what is left instead of paging deeper into a
+    # result set that shrinks underneath us
+    while time.monotonic() < deadline:
+        page = [doc[KEY_FIELD] for doc in search_client.search(search_text="*", filter=filt, select=[KEY_FIELD], top=page_size)]
+        if not page:
+            break
+        keys = [k for k in page if k not in deleted]
+
+        if keys:
+            result = search_client.delete_documents(documents=[{KEY_FIELD: k} for k in keys])
+            unregister_keys(r.key for r in result if r.succeeded)
+            for r in result:
+                if r.succeeded:
+                    deleted.add(r.key)
+                    failures.pop(r.key, None)
+                else:
+                    failures[r.key] = {"key": r.key, "status_code": r.status_code, "error": r.error_message}
+            if not all(k in failures for k in keys):
+                stalls = 0
+                continue
+            # Every delete on the page failed; give up after a few rounds of that
+            stalls += 1
+            if stalls >= CLEAR_MAX_STALLS:
+                break
+        else:
+            # Only keys already deleted are left on the page: deletes become visible
+            # to search shortly after they succeed, so wait for them to catch up
+            stalls += 1
+
+        time.sleep(min(0.5 * 2 ** stalls, 10))
+
+    return {"filter": filt, "deleted": len(deleted), "failures": list(failures.values())}
+
+def index_document_count() -> int:
+    return search_client.get_document_count()
+
+def wait_for_document_count(expected: int, timeout_seconds: float = 60) -> int:
+    deadline = time.monotonic() + timeout_seconds
+    count = search_client.get_document_count()
+    while count != expected and time.monotonic() < deadline:
+        time.sleep(2)
+        count = search_client.get_document_count()
+    return count
+
+def delete_all_chunks_from_index(page_size: int = 1000):
+    filters = key_range_filters()
+    with ThreadPoolExecutor(max_workers=int(CLEAR_CONCURRENCY)) as ex:
+        partitions = list(ex.map(lambda f: _delete_partition(f, page_size), filters))
+
+    total_deleted = sum(p["deleted"] for p in partitions)
+    failures = [f for p in partitions for f in p["failures"]]
+    bump_index_version("clear")
+    remaining = wait_for_document_count(0)
+
+    return {
+        "status": "completed" if remaining == 0 else "incomplete",
+        "mode": "keyed",
         "documents_deleted": total_deleted,
+        "documents_failed": len(failures),
+        "failures": failures[:100],
+        "remaining_documents": remaining,
+        "partitions": len(filters),
+    }
+
+def _scan_partition(lo: Optional[str], hi: Optional[str], repair: bool) -> Dict[str, Any]:
+    indexed: Dict[str, str] = {}
+    results = search_client.search(search_text="*", filter=key_range_filter(lo, hi), select=[KEY_FIELD, "source_url"])
+    for doc in results:
+        indexed[doc[KEY_FIELD]] = doc.get("source_url") or ""
+
+    registered = keys_in_range(lo, hi)
+    missing = [k for k in indexed if k not in registered]
+    orphaned = [k for k in registered if k not in indexed]
+    if repair:
+        register_keys((k, indexed[k]) for k in missing)
+        unregister_keys(orphaned)
+
+    return {"indexed": len(indexed), "registered": len(registered), "missing": missing, "orphaned": orphaned}
+
+def reconcile_key_registry(repair: bool = False) -> Dict[str, Any]:
+    # Compares the local registry with what the index actually holds, one key range
+    # at a time. missing: indexed but not registered (e.g. written before the registry
+    # existed); orphaned: registered but gone from the index.
+    ranges = key_ranges(RECONCILE_BOUNDARIES)
+    with ThreadPoolExecutor(max_workers=int(CLEAR_CONCURRENCY)) as ex:
+        partitions = list(ex.map(lambda r: _scan_partition(r[0], r[1], repair), ranges))
+
+    missing = [k for p in partitions for k in p["missing"]]
+    orphaned = [k for p in partitions for k in p["orphaned"]]
+    print(f"Key registry reconcile: {len(missing)} missing, {len(orphaned)} orphaned (repair={repair})....")
+
+    return {
+        "status": "in_sync" if not missing and not orphaned else ("repaired" if repair else "out_of_sync"),
+        "indexed_keys": sum(p["indexed"] for p in partitions),
+        "registered_keys": sum(p["registered"] for p in partitions),
+        "missing_from_registry": len(missing),
+        "orphaned_in_registry": len(orphaned),
+        "sample_missing": missing[:20],
+        "sample_orphaned": orphaned[:20],
+    }
+
+def _index_url(index_name: str) -> str:
+    return f"{SEARCH_ENDPOINT.rstrip('/')}/indexes/{index_name}?api-version={SEARCH_API_VERSION}"
+
+def recreate_search_index() -> Dict[str, Any]:
+    # Dropping the index discards every document at once; the schema comes back from
+    # build_index_payload()
+    payload = build_index_payload()
+    headers = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
+
+    with httpx.Client(timeout=60) as client:
+        before = client.get(f"{SEARCH_ENDPOINT.rstrip('/')}/indexes/{payload['name']}/docs/$count?api-version={SEARCH_API_VERSION}", headers=headers)
+        dropped = client.delete(_index_url(payload["name"]), headers=headers)
+        if dropped.status_code not in (204, 404):
+            dropped.raise_for_status()
+        created = client.put(_index_url(payload["name"]), headers=headers, json=payload)
+        created.raise_for_status()
+    clear_registry()
+    bump_index_version("recreate")
+
+    remaining = wait_for_document_count(0)
+    return {
+        "status": "completed" if remaining == 0 else "incomplete",
+        "mode": "fast",
+        "documents_deleted": int(before.text.lstrip("\ufeff")) if before.status_code == 200 else None,
+        "remaining_documents": remaining,
     }
 
 async def create_search_index():
-    api_version = "2024-07-01"
     payload = build_index_payload()
     index_name = payload["name"]
 
-    url = f"{SEARCH_ENDPOINT.rstrip('/')}/indexes/{index_name}?api-version={api_version}"
+    url = _index_url(index_name)
     headers = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
 
     async with httpx.AsyncClient(timeout=60) as client:
@@ -0,0 +1,243 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import gzip
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+from contextlib import ExitStack
+from helpers.common import INDEX_NAME, VECTOR_STORED, build_index_payload, embedding_dimensions
+from helpers.embedding_cache import get_cached_embeddings, text_hash
+from helpers.manifest import load_manifest, restore_manifest
+from helpers.open_ai import embedding_cache_namespace
+from helpers.search import (
+    KEY_FIELD,
+    RECONCILE_BOUNDARIES,
+    CLEAR_CONCURRENCY,
+    SEARCH_BATCH_SIZE,
+    SEARCH_UPLOAD_CONCURRENCY,
+    key_ranges,
+    key_range_filter,
+    recreate_search_index,
+    search_client,
+    upload_chunks_in_batches,
+)
+
+load_dotenv()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".cache/snapshots")
+
+SNAPSHOT_VERSION = 2
+VECTOR_FIELD = "embedding"
+SNAPSHOT_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+# A snapshot is a directory holding everything needed to refill an index without
+# Document Intelligence, table summaries or embeddings:
+#   snapshot.json          counts, dimensions, field list, embedding deployment
+#   <field>.jsonl.gz       one JSON value per line per non-vector field, in row order
+#   embeddings.f32         float32 rows, row i belongs to row i of every column;
+#                          a NaN row is a chunk that had no vector
+#   manifest.json.gz       the blob manifest, so the next ingest stays incremental
+
+def snapshot_path(name: str) -> str:
+    if not SNAPSHOT_NAME.match(name or ""):
+        raise ValueError("snapshot name may only contain letters, digits, '_', '-' and '.'")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def snapshot_fields() -> List[str]:
+    return [f["name"] for f in build_index_payload()["fields"] if f["name"] != VECTOR_FIELD]
+
+def _scan_partition(lo: Optional[str], hi: Optional[str], fields: List[str]) -> List[Dict[str, Any]]:
+    select = fields + [VECTOR_FIELD] if VECTOR_STORED.lower() == "true" else fields
+    return list(search_client.search(search_text="*", filter=key_range_filter(lo, hi), select=select))
+
+def _fill_missing_vectors(docs: List[Dict[str, Any]]):
+    # Vectors that are not retrievable (VECTOR_STORED=false) come from the embedding cache
+    missing = [d for d in docs if not d.get(VECTOR_FIELD) and (d.get("chunk") or "").strip()]
+    if not missing:
+        return
+    hashes = [text_hash(d["chunk"].strip()) for d in missing]
+    cached = get_cached_embeddings(embedding_cache_namespace(), hashes)
+    for d, h in zip(missing, hashes):
+        d[VECTOR_FIELD] = cached.get(h)
+
+def _partitions(fields: List[str]) -> Iterator[List[Dict[str, Any]]]:
+    # CLEAR_CONCURRENCY partitions are read at a time, so only that many are in memory
+    ranges = key_ranges(RECONCILE_BOUNDARIES)
+    workers = int(CLEAR_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for i in range(0, len(ranges), workers):
+            yield from ex.map(lambda r: _scan_partition(r[0], r[1], fields), ranges[i:i + workers])
+
+def export_snapshot(name: Optional[str] = None) -> Dict[str, Any]:
+    name = name or time.strftime("%Y%m%d-%H%M%S")
+    path = snapshot_path(name)
+    if os.path.exists(path):
+        raise ValueError(f"snapshot {name} already exists")
+
+    fields = snapshot_fields()
+    dims = embedding_dimensions()
+    empty_row = array("f", [math.nan] * dims).tobytes()
+    count = 0
+    missing_vectors = 0
+    started = time.perf_counter()
+
+    tmp = path + ".partial"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    # Rows are written as each partition arrives, so memory does not grow with the index
+    with ExitStack() as stack:
+        vectors = stack.enter_context(open(os.path.join(tmp, "embeddings.f32"), "wb"))
+        columns = {f: stack.enter_context(gzip.open(os.path.join(tmp, f"{f}.jsonl.gz"), "wt", encoding="utf-8")) for f in fields}
+        for docs in _partitions(fields):
+            _fill_missing_vectors(docs)
+            for d in docs:
+                for f, out in columns.items():
+                    out.write(json.dumps(d.get(f), ensure_ascii=False, separators=(",", ":")) + "\n")
+                vec = d.get(VECTOR_FIELD)
+                if vec and len(vec) == dims:
+                    vectors.write(array("f", vec).tobytes())
+                else:
+                    vectors.write(empty_row)
+                    missing_vectors += 1
+                count += 1
+                if count % 10000 == 0:
+                    print(f"Snapshot {name}: {count} chunks exported....")
+
+    with gzip.open(os.path.join(tmp, "manifest.json.gz"), "wt", encoding="utf-8") as out:
+        json.dump(list(load_manifest().values()), out, separators=(",", ":"))
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "index": INDEX_NAME,
+        "count": count,
+        "dimensions": dims,
+        "byteorder": sys.byteorder,
+        "embedding_deployment": embedding_cache_namespace(),
+        "fields": fields,
+        "missing_vectors": missing_vectors,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp, "snapshot.json"), "w", encoding="utf-8") as out:
+        json.dump(meta, out, indent=2)
+    os.replace(tmp, path)
+    print(f"Snapshot {name}: {count} chunks exported, {missing_vectors} without a vector....")
+
+    return {
+        "status": "completed",
+        "name": name,
+        "path": path,
+        "chunks": count,
+        "missing_vectors": missing_vectors,
+        "bytes": sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path)),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+def read_snapshot_meta(name: str) -> Dict[str, Any]:
+    path = snapshot_path(name)
+    meta_path = os.path.join(path, "snapshot.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"snapshot {name} not found")
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(SNAPSHOT_DIR)):
+        if SNAPSHOT_NAME.match(name) and os.path.exists(os.path.join(SNAPSHOT_DIR, name, "snapshot.json")):
+            meta = read_snapshot_meta(name)
+            out.append({"name": name, **{k: meta[k] for k in ("index", "count", "dimensions", "embedding_deployment", "created_at")}})
+    return out
+
+def _column(stack: ExitStack, path: str, field: str) -> Iterator[Any]:
+    src = stack.enter_context(gzip.open(os.path.join(path, f"{field}.jsonl.gz"), "rt", encoding="utf-8"))
+    return (json.loads(line) for line in src)
+
+def _rows(path: str, meta: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], Optional[List[float]]]]:
+    # Every column is read one line at a time alongside the mmapped vectors
+    dims = meta["dimensions"]
+    row_bytes = dims * 4
+    with ExitStack() as stack:
+        columns = {f: _column(stack, path, f) for f in meta["fields"]}
+        src = stack.enter_context(open(os.path.join(path, "embeddings.f32"), "rb"))
+        view = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if meta["count"] else None
+        if view is not None:
+            stack.callback(view.close)
+        for i in range(meta["count"]):
+            vec = array("f")
+            vec.frombytes(view[i * row_bytes:(i + 1) * row_bytes])
+            if meta["byteorder"] != sys.byteorder:
+                vec.byteswap()
+            yield {f: next(col) for f, col in columns.items()}, None if math.isnan(vec[0]) else vec.tolist()
+
+def import_snapshot(name: str, recreate: bool = False, restore_state: bool = True, force: bool = False) -> Dict[str, Any]:
+    # Straight uploads through the parallel batch uploader; no model is called
+    path = snapshot_path(name)
+    meta = read_snapshot_meta(name)
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {meta['version']}")
+    if meta["dimensions"] != embedding_dimensions():
+        raise ValueError(f"snapshot vectors have {meta['dimensions']} dimensions, the index expects {embedding_dimensions()}")
+    # Same-sized vectors from another model would import cleanly and search badly
+    if meta["embedding_deployment"] != embedding_cache_namespace() and not force:
+        raise ValueError(
+            f"snapshot vectors come from {meta['embedding_deployment']}, this service embeds with "
+            f"{embedding_cache_namespace()}; pass force=true to import anyway"
+        )
+
+    started = time.perf_counter()
+    if recreate:
+        recreate_search_index()
+
+    # Enough documents per round to keep every upload worker busy
+    group_size = int(SEARCH_BATCH_SIZE) * int(SEARCH_UPLOAD_CONCURRENCY) * 4
+    uploaded = 0
+    failures: List[Dict[str, Any]] = []
+    failed_sources = set()
+    group: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal uploaded
+        report = upload_chunks_in_batches(group)
+        uploaded += report["uploaded"]
+        failed_keys = {f["key"] for f in report["failures"]}
+        failed_sources.update(d["source_url"] for d in group if d[KEY_FIELD] in failed_keys)
+        failures.extend(report["failures"])
+        group.clear()
+        print(f"Snapshot {name}: {uploaded}/{meta['count']} chunks imported....")
+
+    for doc, vec in _rows(path, meta):
+        doc[VECTOR_FIELD] = vec
+        group.append(doc)
+        if len(group) >= group_size:
+            flush()
+    if group:
+        flush()
+
+    restored = 0
+    if restore_state:
+        # Blobs whose chunks all made it are marked as ingested; the rest are picked up
+        # by the next ingest run
+        with gzip.open(os.path.join(path, "manifest.json.gz"), "rt", encoding="utf-8") as src:
+            rows = [r for r in json.load(src) if r["source_url"] not in failed_sources]
+        restore_manifest(rows)
+        restored = len(rows)
+
+    return {
+        "status": "completed" if not failures else "incomplete",
+        "name": name,
+        "chunks": meta["count"],
+        "uploaded": uploaded,
+        "failed": len(failures),
+        "failures": failures[:100],
+        "manifest_restored": restored,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
@@ -0,0 +1,77 @@
+from typing import BinaryIO, Iterator, Union
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import io
+import mmap
+import os
+import tempfile
+
+load_dotenv()
+
+BLOB_SPOOL_MAX_BYTES = os.getenv("BLOB_SPOOL_MAX_BYTES", str(8 * 1024 ** 2))
+
+# Downloaded files live in spooled temporary files: small ones stay in memory, larger
+# ones roll over to disk and are read back through mmap, so a large document never
+# has to be held in memory as one bytes object.
+Buffer = Union[bytes, mmap.mmap]
+
+def new_spool() -> BinaryIO:
+    return tempfile.SpooledTemporaryFile(max_size=int(BLOB_SPOOL_MAX_BYTES))
+
+def spool_size(f: BinaryIO) -> int:
+    f.seek(0, io.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+@contextmanager
+def buffer_view(source: Union[bytes, BinaryIO]) -> Iterator[Buffer]:
+    if isinstance(source, bytes):
+        yield source
+        return
+
+    size = spool_size(source)
+    if size == 0 or size <= int(BLOB_SPOOL_MAX_BYTES):
+        # Still in memory; a copy this small is cheaper than rolling it to disk
+        yield source.read()
+        return
+
+    view = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield view
+    finally:
+        view.close()
+
+class BufferReader(io.RawIOBase):
+    # A file object with its own read position over a shared buffer, so concurrent
+    # requests can each stream the same document without copying it
+
+    def __init__(self, buffer: Buffer):
+        self._view = memoryview(buffer)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        # Release the export so the mmap behind it can be closed
+        if not self.closed:
+            self._view.release()
+        super().close()
@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import os
+import sqlite3
+import threading
+
+load_dotenv()
+
+INGEST_STATE_DB = os.getenv("INGEST_STATE_DB", ".cache/ingestion.db")
+
+# One shared connection for the ingestion service's local bookkeeping (manifest and
+# friends). Pipeline stages run on several threads, so access is serialized here.
+_conn = None
+_lock = threading.RLock()
+
+def _get_connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        db_dir = os.path.dirname(INGEST_STATE_DB)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        _conn = sqlite3.connect(INGEST_STATE_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+    return _conn
+
+@contextmanager
+def state_db():
+    with _lock:
+        conn = _get_connection()
+        with conn:
+            yield conn
@@ -0,0 +1,45 @@
+from typing import Dict, Sequence
+import hashlib
+import time
+from helpers.state import state_db
+
+# (model deployment, hash of raw table text) -> summary, so identical tables across
+# documents and runs are summarized once
+with state_db() as _db:
+    _db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_summary_cache (
+            deployment TEXT NOT NULL,
+            table_hash TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at REAL,
+            PRIMARY KEY (deployment, table_hash)
+        )
+        """
+    )
+
+def table_hash(table_text: str) -> str:
+    return hashlib.sha256(table_text.encode("utf-8")).hexdigest()
+
+def get_cached_summaries(deployment: str, hashes: Sequence[str]) -> Dict[str, str]:
+    unique = list(dict.fromkeys(hashes))
+    found: Dict[str, str] = {}
+    with state_db() as db:
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            rows = db.execute(
+                f"SELECT table_hash, summary FROM table_summary_cache WHERE deployment = ? AND table_hash IN ({','.join('?' * len(part))})",
+                [deployment, *part],
+            ).fetchall()
+            found.update({r["table_hash"]: r["summary"] for r in rows})
+    return found
+
+def put_cached_summaries(deployment: str, summaries: Dict[str, str]):
+    if not summaries:
+        return
+    now = time.time()
+    with state_db() as db:
+        db.executemany(
+            "INSERT OR REPLACE INTO table_summary_cache (deployment, table_hash, summary, created_at) VALUES (?, ?, ?, ?)",
+            [(deployment, h, s, now) for h, s in summaries.items()],
+        )
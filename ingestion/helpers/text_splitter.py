@@ -0,0 +1,106 @@
+from typing import List, Optional, Sequence, Tuple
+from helpers.tokens import count_tokens_batch, token_char_offsets
+
+Span = Tuple[int, int]
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+class TokenTextSplitter:
+    # Same separator hierarchy and merge rules as LangChain's RecursiveCharacterTextSplitter
+    # (separator kept at the start of the following piece, whitespace stripped), but sizes
+    # are counted in tokens and every piece is a (start, end) range into the source text.
+    # Chunks are sliced from the source once, at the end.
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: Optional[Sequence[str]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_offsets(self, text: str) -> List[Span]:
+        spans = self._split(text, 0, len(text), self.separators)
+        return [s for s in (self._strip(text, start, end) for start, end in spans) if s[0] < s[1]]
+
+    def _split(self, text: str, start: int, end: int, separators: List[str]) -> List[Span]:
+        separator, rest = "", []
+        for i, sep in enumerate(separators):
+            if sep == "" or text.find(sep, start, end) != -1:
+                separator, rest = sep, separators[i + 1:]
+                break
+
+        if separator == "":
+            return self._split_by_tokens(text, start, end)
+
+        chunks: List[Span] = []
+        pending: List[Tuple[int, int, int]] = []
+        pieces = self._pieces(text, start, end, separator)
+        counts = count_tokens_batch([text[s:e] for s, e in pieces])
+        for (piece_start, piece_end), tokens in zip(pieces, counts):
+            if tokens < self.chunk_size:
+                pending.append((piece_start, piece_end, tokens))
+                continue
+            if pending:
+                chunks.extend(self._merge(pending))
+                pending = []
+            if rest:
+                chunks.extend(self._split(text, piece_start, piece_end, rest))
+            else:
+                chunks.append((piece_start, piece_end))
+        if pending:
+            chunks.extend(self._merge(pending))
+        return chunks
+
+    def _pieces(self, text: str, start: int, end: int, separator: str) -> List[Span]:
+        # Cut before each separator, so it leads the next piece
+        pieces: List[Span] = []
+        piece_start = start
+        pos = text.find(separator, start, end)
+        while pos != -1:
+            if pos > piece_start:
+                pieces.append((piece_start, pos))
+            piece_start = pos
+            pos = text.find(separator, pos + len(separator), end)
+        if end > piece_start:
+            pieces.append((piece_start, end))
+        return pieces
+
+    def _merge(self, pieces: List[Tuple[int, int, int]]) -> List[Span]:
+        # Pieces are contiguous, so a run of them is one source range
+        chunks: List[Span] = []
+        window: List[Tuple[int, int, int]] = []
+        total = 0
+        for piece in pieces:
+            tokens = piece[2]
+            if window and total + tokens > self.chunk_size:
+                chunks.append((window[0][0], window[-1][1]))
+                while window and (total > self.chunk_overlap or total + tokens > self.chunk_size):
+                    total -= window.pop(0)[2]
+            window.append(piece)
+            total += tokens
+        if window:
+            chunks.append((window[0][0], window[-1][1]))
+        return chunks
+
+    def _split_by_tokens(self, text: str, start: int, end: int) -> List[Span]:
+        # No separator left: cut on token boundaries, chunk_size tokens per window
+        offsets = [start + o for o in token_char_offsets(text[start:end])]
+        step = self.chunk_size - self.chunk_overlap
+        spans: List[Span] = []
+        for i in range(0, len(offsets), step):
+            j = i + self.chunk_size
+            spans.append((offsets[i], offsets[j] if j < len(offsets) else end))
+            if j >= len(offsets):
+                break
+        return spans
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Span:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
@@ -0,0 +1,47 @@
+from typing import List, Optional
+from dotenv import load_dotenv
+import os
+import threading
+import tiktoken
+
+load_dotenv()
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+# Used only when the tiktoken encoding cannot be loaded (it is downloaded on first use)
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+_lock = threading.Lock()
+
+def get_encoding() -> Optional[tiktoken.Encoding]:
+    global _encoding, _encoding_failed
+    with _lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                print(f"Token encoding {TOKEN_ENCODING} unavailable, estimating tokens from length: {e}")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    enc = get_encoding()
+    if enc is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    enc = get_encoding()
+    if enc is None:
+        return [count_tokens(t) for t in texts]
+    return [len(tokens) for tokens in enc.encode_batch(texts, disallowed_special=())]
+
+def token_char_offsets(text: str) -> List[int]:
+    # Character offset at which each token of `text` starts
+    enc = get_encoding()
+    if enc is None:
+        return list(range(0, len(text), CHARS_PER_TOKEN))
+    _, offsets = enc.decode_with_offsets(enc.encode(text, disallowed_special=()))
+    return offsets
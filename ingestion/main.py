@@ -1,12 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from typing import Optional
 from fastapi import Request
 import json
-from helpers.blob import get_blobs
-from helpers.chunking import generate_chunks_for_files
-from helpers.open_ai import add_embeddings_to_chunks
-from helpers.common import get_unique_source_urls
-from helpers.search import fetch_keys_for_existing_source_urls, delete_keys_in_batches, upload_chunks_in_batches
-from helpers.search import delete_all_chunks_from_index, create_search_index
+from helpers.jobs import submit_ingest_job, get_job, list_jobs, cancel_job, resume_job
+from helpers.search import delete_all_chunks_from_index, recreate_search_index, create_search_index, reconcile_key_registry
+from helpers.key_registry import registry_stats
+from helpers.layout_cache import layout_cache_stats, purge_layout_cache
+from helpers.manifest import clear_manifest
+from helpers.snapshot import export_snapshot, import_snapshot, list_snapshots
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -23,30 +24,38 @@ def index():
     return {"response": "hello world v2"}
 
 @app.post("/ingest")
-async def ingest():
+def ingest(full: bool = False):
 
-    print("Getting blob contents....")
-    blob_inputs = get_blobs()
+    # Documents stream through layout -> chunk -> embed -> upload on a background
+    # worker; poll /ingest/{job_id} for progress
+    print("Queueing ingestion job....")
+    job = submit_ingest_job(full=full)
+    return {"job_id": job["id"], "status": job["status"]}
 
-    print("Generating chunks....")
-    chunks = generate_chunks_for_files(blob_inputs)
-    
-    print("Generating embeddings....")
-    chunks_with_embedding = add_embeddings_to_chunks(chunks)
-    
-    print("Checking existing chunks in search index....")
-    source_urls = get_unique_source_urls(chunks_with_embedding)
-    keys = fetch_keys_for_existing_source_urls(source_urls)
+@app.get("/ingest")
+def ingest_jobs(limit: int = 20):
+    return list_jobs(limit=limit)
 
-    if keys:
-        print("Deleting existing chunks from search index....")
-        delete_keys_in_batches(keys)
-    
-    print("Uploading all chunks into search index....")
-    ingestion_response = upload_chunks_in_batches(chunks_with_embedding)
-    print(ingestion_response)
-    
-    return ingestion_response
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/ingest/{job_id}/cancel")
+def ingest_cancel(job_id: str):
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/ingest/{job_id}/resume")
+def ingest_resume(job_id: str):
+    job = resume_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.post("/create-index")
 async def create_index():
@@ -58,6 +67,53 @@ async def create_index():
     
 
 @app.post("/clear-index")
-async def clear_index():
-    response = delete_all_chunks_from_index()
-    return response
\ No newline at end of file
+def clear_index(mode: str = "keyed"):
+    # keyed: parallel deletes by key range; fast: drop and recreate the index
+    if mode == "fast":
+        response = recreate_search_index()
+    elif mode == "keyed":
+        response = delete_all_chunks_from_index()
+    else:
+        raise HTTPException(status_code=400, detail="mode must be 'keyed' or 'fast'")
+    clear_manifest()
+    return response
+
+@app.get("/layout-cache")
+def layout_cache(entries: bool = False):
+    return layout_cache_stats(include_entries=entries)
+
+@app.post("/layout-cache/purge")
+def layout_cache_purge(model_id: Optional[str] = None):
+    return purge_layout_cache(model_id=model_id)
+
+@app.get("/key-registry")
+def key_registry():
+    return registry_stats()
+
+@app.post("/key-registry/reconcile")
+def key_registry_reconcile(repair: bool = False):
+    # Compare the local key registry with the index; repair=true makes the registry match
+    return reconcile_key_registry(repair=repair)
+
+@app.get("/snapshots")
+def snapshots():
+    return list_snapshots()
+
+@app.post("/export-snapshot")
+def snapshot_export(name: Optional[str] = None):
+    # Every chunk in the index with its vector, written under SNAPSHOT_DIR
+    try:
+        return export_snapshot(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/import-snapshot")
+def snapshot_import(name: str, recreate: bool = False, restore_state: bool = True, force: bool = False):
+    # Refill the index from a snapshot without calling any model; recreate=true drops
+    # and recreates the index first, force=true accepts vectors from another deployment
+    try:
+        return import_snapshot(name, recreate=recreate, restore_state=restore_state, force=force)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+# Tests import the service's modules the way it runs: from ingestion/, as helpers.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The Azure clients are created at import time but never called by the tests; they only
+# need well-formed settings. Local state goes to a throwaway directory.
+_state_dir = tempfile.mkdtemp(prefix="ingestion-tests-")
+for name, value in {
+    "AZURE_SEARCH_ENDPOINT": "https://example.search.windows.net",
+    "AZURE_SEARCH_ADMIN_KEY": "test",
+    "AZURE_SEARCH_INDEX": "test-index",
+    "AZURE_OPENAI_ENDPOINT": "https://example.openai.azure.com",
+    "AZURE_OPENAI_API_KEY": "test",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "embedding",
+    "AZURE_OPENAI_MODEL_DEPLOYMENT": "chat",
+    "AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT": "https://example.cognitiveservices.azure.com",
+    "AZURE_DOCUMENT_INTELLIGENCE_KEY": "test",
+    "AZURE_DOCUMENT_INTELLIGENCE_MODEL": "prebuilt-layout",
+    "AZURE_STORAGE_CONNECTION_STRING": "DefaultEndpointsProtocol=https;AccountName=example;AccountKey=dGVzdA==;EndpointSuffix=core.windows.net",
+    "AZURE_STORAGE_CONTAINER": "test",
+    "DEFAULT_CHUNK_SIZE": "1200",
+    "DEFAULT_CHUNK_OVERLAP": "150",
+    "SEARCH_BATCH_SIZE": "100",
+    "INGEST_STATE_DB": os.path.join(_state_dir, "ingestion.db"),
+    "INDEX_VERSION_FILE": os.path.join(_state_dir, "index_version.json"),
+}.items():
+    os.environ.setdefault(name, value)
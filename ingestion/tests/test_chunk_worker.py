@@ -0,0 +1,36 @@
+from helpers.chunk_worker import split_offsets
+from helpers.text_splitter import TokenTextSplitter
+
+
+class ListSplitter:
+    # Stands in for a LangChain splitter: returns the chunks it was given
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def split_text(self, text):
+        return list(self.chunks)
+
+
+def test_verbatim_chunks_get_their_ranges():
+    text = "alpha beta\n\ngamma delta\n\nalpha beta"
+    spans = split_offsets(ListSplitter(["alpha beta", " gamma delta ", "alpha beta"]), text)
+    assert spans == [("alpha beta", 0, 10), ("gamma delta", 12, 23), ("alpha beta", 25, 35)]
+    assert all(text[start:end] == chunk for chunk, start, end in spans)
+
+
+def test_rewritten_chunk_gets_no_range_and_does_not_reset_position():
+    # The second chunk has its line break collapsed, so it is not a substring of the text
+    text = "one two\nthree four\n\nfive six\n\none two"
+    spans = split_offsets(ListSplitter(["five six", "three  four", "one two"]), text)
+    assert spans[0] == ("five six", 20, 28)
+    assert spans[1] == ("three  four", None, None)
+    # Searching resumes after "five six", so this is the last "one two", not the first
+    assert spans[2] == ("one two", 30, 37)
+
+
+def test_token_splitter_ranges_slice_back_to_chunks():
+    text = "\n\n".join(" ".join(f"w{i}{j}" for j in range(40)) for i in range(8))
+    splitter = TokenTextSplitter(chunk_size=60, chunk_overlap=10)
+    spans = split_offsets(splitter, text)
+    assert [chunk for chunk, _, _ in spans] == splitter.split_text(text)
+    assert all(text[start:end] == chunk for chunk, start, end in spans)
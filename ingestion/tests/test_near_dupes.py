@@ -0,0 +1,66 @@
+import random
+import time
+
+import helpers.near_dupes as near_dupes
+import helpers.pipeline as pipeline
+from helpers.common import generate_chunk_key
+from helpers.key_registry import register_keys
+
+
+
+def make_doc(name, paragraphs):
+    source_url = f"https://example.blob.core.windows.net/test/{name}"
+    chunks = [
+        {"id": generate_chunk_key(source_url, i, text), "source_url": source_url, "chunk": text}
+        for i, text in enumerate(paragraphs, 1)
+    ]
+    return {"name": name, "filename": name, "source_url": source_url, "content_hash": name, "chunks": chunks, "existing_keys": []}
+
+
+def paragraph(rng, length=60):
+    return " ".join(f"term{rng.randrange(5000)}" for _ in range(length))
+
+
+def slow_sync(chunks, existing_keys):
+    # A slow upload keeps the first copy in flight while the second reaches the embed stage
+    time.sleep(0.3)
+    register_keys((c["id"], c["source_url"]) for c in chunks)
+    return {"written": len(chunks), "failed": 0, "deleted": 0, "unchanged": 0, "upload": None}
+
+
+def test_near_identical_blobs_in_one_run_are_folded(monkeypatch):
+    monkeypatch.setattr(near_dupes, "NEAR_DUP_THRESHOLD", "0.7")
+    monkeypatch.setattr(pipeline, "sync_chunks", slow_sync)
+    monkeypatch.setattr(pipeline, "add_embeddings_to_chunks", lambda chunks: None)
+    monkeypatch.setattr(pipeline, "set_alias_sources", lambda aliases: {"failed": 0})
+
+    rng = random.Random(1)
+    original = [paragraph(rng), paragraph(rng)]
+    copy = [original[0] + " appendix", original[1]]
+    docs = [make_doc("report.docx", original), make_doc("report-copy.docx", copy)]
+
+    results = []
+    pending = near_dupes.PendingSignatures()
+    stages = [
+        ("embed", pipeline.make_embed_stage(pending), 1),
+        ("upload", pipeline.make_upload_stage(results, pending), 1),
+    ]
+    stats = pipeline.run_pipeline(iter(docs), stages, queue_size=4)
+
+    assert not stats["cancelled"]
+    by_name = {r["name"]: r for r in results}
+    assert by_name["report.docx"]["aliased"] == 0
+    assert by_name["report-copy.docx"]["aliased"] == 2
+    assert by_name["report-copy.docx"]["written"] == 0
+
+
+def test_near_duplicate_chunks_within_a_document_are_folded(monkeypatch):
+    monkeypatch.setattr(near_dupes, "NEAR_DUP_THRESHOLD", "0.7")
+    rng = random.Random(2)
+    first, second = paragraph(rng), paragraph(rng)
+    doc = make_doc("handbook.docx", [first, second, first + " again"])
+    signatures = {c["id"]: near_dupes.minhash_signature(c["chunk"]) for c in doc["chunks"]}
+
+    aliases = near_dupes.find_near_duplicates(doc["chunks"], signatures)
+
+    assert aliases == {doc["chunks"][2]["id"]: doc["chunks"][0]["id"]}
@@ -0,0 +1,161 @@
+# Micro-benchmark for the paragraph/table dedup in helpers/document_parser.py on a
+# synthetic layout, against the straightforward every-paragraph-vs-every-table scan,
+# plus the memory held by the full layout tree versus its slim extraction.
+#
+#   python -m tools.bench_document_parser --pages 500 --paragraphs-per-page 30 --tables-per-page 12
+#
+# Both implementations must produce identical units; the run fails otherwise.
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+from helpers.document_parser import (
+    LayoutItem,
+    bbox_iou,
+    build_units_polygon,
+    build_units_spans,
+    extract_paragraph_items,
+    extract_table_items,
+    page_and_bbox,
+    slim_layout,
+    spans_range,
+)
+
+def region(page: int, x: float, y: float, w: float, h: float) -> List[Dict[str, Any]]:
+    return [{"pageNumber": page, "polygon": [x, y, x + w, y, x + w, y + h, x, y + h]}]
+
+def synthetic_layout(pages: int, paragraphs_per_page: int, tables_per_page: int, seed: int) -> Dict[str, Any]:
+    # Tables are laid out in a column of slots; paragraphs land anywhere on the page,
+    # and every table also gets a paragraph that repeats its text (the duplicate DI reports)
+    rng = random.Random(seed)
+    paragraphs: List[Dict[str, Any]] = []
+    tables: List[Dict[str, Any]] = []
+    page_items: List[Dict[str, Any]] = []
+    offset = 0
+
+    for page in range(1, pages + 1):
+        # Words and lines dominate the size of a real layout result
+        words = [
+            {"content": f"w{i}", "polygon": [1.0, 1.0, 1.2, 1.0, 1.2, 1.1, 1.0, 1.1], "confidence": 0.99, "span": {"offset": i, "length": 2}}
+            for i in range(paragraphs_per_page * 12)
+        ]
+        lines = [
+            {"content": f"line {i}", "polygon": [1.0, 1.0, 7.0, 1.0, 7.0, 1.1, 1.0, 1.1], "spans": [{"offset": i, "length": 6}]}
+            for i in range(paragraphs_per_page * 2)
+        ]
+        page_items.append({"pageNumber": page, "width": 8.5, "height": 11, "unit": "inch", "words": words, "lines": lines})
+
+        slot_h = 10.0 / max(tables_per_page, 1)
+        for t in range(tables_per_page):
+            x, y, w, h = rng.uniform(0.5, 3.0), t * slot_h, rng.uniform(2.0, 5.0), slot_h * 0.8
+            length = rng.randint(100, 400)
+            tables.append({
+                "boundingRegions": region(page, x, y, w, h),
+                "spans": [{"offset": offset, "length": length}],
+                "cells": [
+                    {"row_index": r, "column_index": c, "content": f"p{page}t{t}r{r}c{c}"}
+                    for r in range(3) for c in range(3)
+                ],
+            })
+            paragraphs.append({
+                "content": f"table text p{page}t{t}",
+                "boundingRegions": region(page, x + 0.1, y + 0.1, w - 0.2, h - 0.2),
+                "spans": [{"offset": offset + 10, "length": 20}],
+            })
+            offset += length + 1
+
+        for i in range(paragraphs_per_page):
+            length = rng.randint(20, 200)
+            paragraphs.append({
+                "content": f"paragraph p{page}n{i}",
+                "boundingRegions": region(page, rng.uniform(0, 7), rng.uniform(0, 10), rng.uniform(0.5, 6), rng.uniform(0.2, 1.0)),
+                "spans": [{"offset": offset, "length": length}],
+            })
+            offset += length + 1
+
+    return {"pages": page_items, "paragraphs": paragraphs, "tables": tables}
+
+def reference_spans(paragraph_items: List[LayoutItem], table_items: List[LayoutItem]) -> List[Dict[str, Any]]:
+    items = [{"kind": x.kind, "index": x.index, "text": x.text, "start": spans_range(x)[0], "end": spans_range(x)[1]} for x in paragraph_items + table_items]
+    items.sort(key=lambda x: x["start"])
+    table_spans = [(x["start"], x["end"]) for x in items if x["kind"] == "table"]
+
+    def overlaps(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+        return max(a[0], b[0]) < min(a[1], b[1])
+
+    return [
+        {"type": it["kind"], "text": it["text"], "meta": {"index": it["index"]}}
+        for it in items
+        if not (it["kind"] == "paragraph" and any(overlaps((it["start"], it["end"]), tr) for tr in table_spans))
+    ]
+
+def reference_polygon(paragraph_items: List[LayoutItem], table_items: List[LayoutItem], iou_threshold: float = 0.35) -> List[Dict[str, Any]]:
+    tables = [{"kind": t.kind, "index": t.index, "text": t.text, "page": pb[0], "bbox": pb[1]} for t in table_items for pb in [page_and_bbox(t)]]
+    tables_by_page: Dict[int, List[Dict[str, Any]]] = {}
+    for t in tables:
+        if t["page"] and t["bbox"]:
+            tables_by_page.setdefault(t["page"], []).append(t)
+
+    kept = []
+    for p in paragraph_items:
+        page, bbox = page_and_bbox(p)
+        if not page or not bbox or not any(bbox_iou(bbox, t["bbox"]) >= iou_threshold for t in tables_by_page.get(page, [])):
+            kept.append({"kind": p.kind, "index": p.index, "text": p.text, "page": page, "bbox": bbox})
+
+    def sort_key(x: Dict[str, Any]):
+        page = x.get("page") or 10**9
+        return (page, x["bbox"][1], x["bbox"][0]) if x.get("bbox") else (page, 10**9, 10**9)
+
+    merged = sorted(kept + tables, key=sort_key)
+    return [{"type": x["kind"], "text": x["text"], "meta": {"index": x["index"]}} for x in merged]
+
+def layout_memory(payload: str) -> Tuple[int, int]:
+    # Bytes held by the decoded layout tree, and by its slim extraction once the tree is released
+    tracemalloc.start()
+    result_dict = json.loads(payload)
+    full_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    layout = slim_layout(result_dict)
+    del result_dict
+    slim_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del layout
+    return full_bytes, slim_bytes
+
+def timed(fn, *args) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - started, out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--paragraphs-per-page", type=int, default=30)
+    parser.add_argument("--tables-per-page", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    layout = synthetic_layout(args.pages, args.paragraphs_per_page, args.tables_per_page, args.seed)
+    paragraph_items = extract_paragraph_items(layout)
+    table_items = extract_table_items(layout)
+    print(f"{len(paragraph_items)} paragraphs, {len(table_items)} tables over {args.pages} pages")
+
+    for name, reference, indexed in (
+        ("spans", reference_spans, build_units_spans),
+        ("polygon", reference_polygon, build_units_polygon),
+    ):
+        ref_s, ref_units = timed(reference, paragraph_items, table_items)
+        new_s, new_units = timed(indexed, paragraph_items, table_items)
+        if new_units != ref_units:
+            raise SystemExit(f"{name}: indexed output differs from the reference")
+        print(f"{name:8s} reference {ref_s * 1000:9.1f} ms   indexed {new_s * 1000:9.1f} ms   speedup {ref_s / max(new_s, 1e-9):6.1f}x   units {len(new_units)}")
+
+    full_bytes, slim_bytes = layout_memory(json.dumps(layout))
+    print(f"memory   layout tree {full_bytes / 2**20:9.1f} MiB   slim layout {slim_bytes / 2**20:9.1f} MiB   ratio {full_bytes / max(slim_bytes, 1):6.1f}x")
+
+if __name__ == "__main__":
+    main()
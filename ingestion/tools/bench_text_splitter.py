@@ -0,0 +1,64 @@
+# Throughput of the token-budget splitter (helpers/text_splitter.py) against the
+# LangChain character splitter on the demo corpus.
+#
+#   python -m tools.bench_text_splitter --files ../demo-files --repeat 20
+#
+# Text is read straight from the .docx XML (one paragraph per w:p element), so the
+# benchmark needs neither Document Intelligence nor python-docx.
+import argparse
+import glob
+import html
+import os
+import re
+import time
+import zipfile
+from typing import List
+from dotenv import load_dotenv
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from helpers.text_splitter import TokenTextSplitter
+from helpers.tokens import TOKEN_ENCODING, count_tokens_batch, get_encoding
+
+load_dotenv()
+
+DOCX_PARAGRAPH = re.compile(r"<w:p[ >].*?</w:p>", re.S)
+DOCX_TEXT = re.compile(r"<w:t[^>]*>([^<]*)</w:t>")
+
+def docx_text(path: str) -> str:
+    xml = zipfile.ZipFile(path).read("word/document.xml").decode("utf-8")
+    paragraphs = ("".join(DOCX_TEXT.findall(p)) for p in DOCX_PARAGRAPH.findall(xml))
+    return "\n\n".join(html.unescape(p) for p in paragraphs if p.strip())
+
+def run(name: str, splitter, texts: List[str], repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        chunks = [c for t in texts for c in splitter.split_text(t)]
+    elapsed = time.perf_counter() - started
+
+    mb = sum(len(t.encode("utf-8")) for t in texts) * repeat / 2**20
+    tokens = count_tokens_batch(chunks)
+    print(
+        f"{name:10s} {mb / elapsed:8.2f} MB/s   chunks {len(chunks):5d}   "
+        f"tokens/chunk mean {sum(tokens) / max(len(tokens), 1):7.1f} max {max(tokens, default=0):5d}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", default=os.path.join("..", "demo-files"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("DEFAULT_CHUNK_SIZE") or 1200))
+    parser.add_argument("--chunk-overlap", type=int, default=int(os.getenv("DEFAULT_CHUNK_OVERLAP") or 150))
+    parser.add_argument("--chunk-size-tokens", type=int, default=int(os.getenv("CHUNK_SIZE_TOKENS") or 300))
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=int(os.getenv("CHUNK_OVERLAP_TOKENS") or 40))
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.files, "*.docx")))
+    texts = [docx_text(p) for p in paths]
+    encoding = TOKEN_ENCODING if get_encoding() is not None else "length estimate"
+    print(f"{len(paths)} documents, {sum(len(t) for t in texts)} characters, tokens counted with {encoding}")
+
+    separators = ["\n\n", "\n", " ", ""]
+    run("character", RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, separators=separators), texts, args.repeat)
+    run("token", TokenTextSplitter(args.chunk_size_tokens, args.chunk_overlap_tokens, separators), texts, args.repeat)
+
+if __name__ == "__main__":
+    main()
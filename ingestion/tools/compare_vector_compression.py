@@ -0,0 +1,135 @@
+# Offline comparison of the index's vector storage options: memory per vector against
+# recall@k, measured on a held-out query set against an exact (brute-force) kNN baseline.
+#
+#   python -m tools.compare_vector_compression                 # vectors from the embedding cache
+#   python -m tools.compare_vector_compression --synthetic 20000 --dims 1536
+#
+# Needs numpy (pip install numpy); the service itself does not. The quantizers mirror
+# what VECTOR_COMPRESSION configures: scalar = int8 per dimension, binary = 1 bit per
+# dimension, both optionally re-ranked with the original vectors over k * oversampling
+# candidates. Reduced dimensions truncate and renormalize, which is only meaningful for
+# text-embedding-3 models (EMBEDDING_DIMENSIONS).
+import argparse
+import glob
+import os
+import re
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+try:
+    import numpy as np
+except ImportError:
+    raise SystemExit("This tool needs numpy: pip install numpy")
+
+load_dotenv()
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+FLOAT_BYTES = 4
+
+def load_cached_vectors(cache_dir: str) -> Optional["np.ndarray"]:
+    # Largest float32 file written by helpers/embedding_cache.py (<deployment>-<dims>.f32)
+    files = sorted(glob.glob(os.path.join(cache_dir, "*.f32")), key=os.path.getsize, reverse=True)
+    for path in files:
+        m = re.search(r"-(\d+)\.f32$", path)
+        if not m:
+            continue
+        dims = int(m.group(1))
+        data = np.fromfile(path, dtype=np.float32)
+        rows = len(data) // dims
+        if rows:
+            print(f"Loaded {rows} vectors of {dims} dims from {path}")
+            return data[: rows * dims].reshape(rows, dims)
+    return None
+
+def synthetic_vectors(n: int, dims: int, seed: int) -> "np.ndarray":
+    # Clustered, so neighbours are meaningful the way they are for real embeddings
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 50, 1), dims)).astype(np.float32)
+    assignment = rng.integers(0, len(centers), size=n)
+    return centers[assignment] + 0.6 * rng.normal(size=(n, dims)).astype(np.float32)
+
+def normalize(v: "np.ndarray") -> "np.ndarray":
+    return v / np.maximum(np.linalg.norm(v, axis=-1, keepdims=True), 1e-12)
+
+def top_k(scores: "np.ndarray", k: int) -> "np.ndarray":
+    idx = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+def rerank(candidates: "np.ndarray", corpus: "np.ndarray", queries: "np.ndarray", k: int) -> "np.ndarray":
+    exact = np.einsum("qcd,qd->qc", corpus[candidates], queries)
+    return np.take_along_axis(candidates, top_k(exact, k), axis=1)
+
+def recall(found: "np.ndarray", truth: "np.ndarray") -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def scalar_scores(corpus: "np.ndarray", queries: "np.ndarray") -> "np.ndarray":
+    lo, hi = corpus.min(axis=0), corpus.max(axis=0)
+    scale = np.maximum(hi - lo, 1e-12) / 255.0
+    codes = np.round((corpus - lo) / scale).astype(np.uint8)
+    return queries @ (codes.astype(np.float32) * scale + lo).T
+
+def binary_scores(corpus: "np.ndarray", queries: "np.ndarray") -> "np.ndarray":
+    # Hamming similarity between sign bits
+    c = np.packbits(corpus > 0, axis=1)
+    q = np.packbits(queries > 0, axis=1)
+    bits = corpus.shape[1]
+    return np.stack([bits - np.unpackbits(np.bitwise_xor(c, row), axis=1).sum(axis=1) for row in q]).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-dir", default=EMBEDDING_CACHE_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of the embedding cache")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--oversampling", type=float, default=10.0)
+    parser.add_argument("--reduced-dims", default="512,256")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vectors = None if args.synthetic else load_cached_vectors(args.cache_dir)
+    if vectors is None:
+        n = args.synthetic or 20000
+        print(f"Using {n} synthetic vectors of {args.dims} dims")
+        print("Synthetic vectors carry no Matryoshka structure, so reduced-dimension recall is a lower bound")
+        vectors = synthetic_vectors(n, args.dims, args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(vectors))
+    n_queries = min(args.queries, len(vectors) // 5)
+    queries = normalize(vectors[order[:n_queries]])
+    corpus = normalize(vectors[order[n_queries:]])
+    n, dims = corpus.shape
+    k = args.k
+    pool = int(k * args.oversampling)
+    print(f"{n} corpus vectors, {n_queries} held-out queries, recall@{k}, oversampling {args.oversampling:g}\n")
+
+    truth = top_k(queries @ corpus.T, k)
+    results: List[Tuple[str, int, int, float]] = [("float32 (none)", dims * FLOAT_BYTES, 0, 1.0)]
+
+    scalar = scalar_scores(corpus, queries)
+    results.append(("scalar int8", dims, 0, recall(top_k(scalar, k), truth)))
+    results.append(("scalar int8 + rerank", dims, dims * FLOAT_BYTES, recall(rerank(top_k(scalar, pool), corpus, queries, k), truth)))
+
+    binary = binary_scores(corpus, queries)
+    results.append(("binary", dims // 8, 0, recall(top_k(binary, k), truth)))
+    results.append(("binary + rerank", dims // 8, dims * FLOAT_BYTES, recall(rerank(top_k(binary, pool), corpus, queries, k), truth)))
+
+    for reduced in [int(d) for d in args.reduced_dims.split(",") if d.strip()]:
+        if reduced >= dims:
+            continue
+        rc, rq = normalize(corpus[:, :reduced]), normalize(queries[:, :reduced])
+        results.append((f"{reduced} dims float32", reduced * FLOAT_BYTES, 0, recall(top_k(rq @ rc.T, k), truth)))
+        rb = binary_scores(rc, rq)
+        results.append((f"{reduced} dims binary + rerank", reduced // 8, reduced * FLOAT_BYTES, recall(rerank(top_k(rb, pool), rc, rq, k), truth)))
+
+    # memory: bytes per vector the search service holds in memory for the HNSW graph.
+    # disk: the float32 originals that rerank reads back from storage. VECTOR_STORED
+    # adds another retrievable float32 copy on top of any option.
+    print(f"{'option':32s} {'memory B/vec':>12s} {'memory MiB':>10s} {'disk B/vec':>10s} {'disk MiB':>9s} {'recall@' + str(k):>9s}")
+    for name, memory, disk, r in results:
+        print(f"{name:32s} {memory:12d} {memory * n / 2**20:10.1f} {disk:10d} {disk * n / 2**20:9.1f} {r:9.3f}")
+
+if __name__ == "__main__":
+    main()
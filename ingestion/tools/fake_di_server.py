@@ -0,0 +1,99 @@
+# Local stand-in for the Document Intelligence layout API, for exercising the
+# concurrent analysis engine without an Azure resource.
+#
+#   uvicorn tools.fake_di_server:app --port 8100
+#   AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT=http://localhost:8100
+#
+# Every page gets two paragraphs and one 2x2 table. FAKE_DI_LATENCY_SECONDS
+# controls how long each operation stays "running" before it succeeds.
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Dict, List
+from fastapi import FastAPI, Request, Response
+from helpers.document_intelligence import count_pdf_pages
+
+app = FastAPI()
+
+FAKE_DI_LATENCY_SECONDS = float(os.getenv("FAKE_DI_LATENCY_SECONDS", "1.0"))
+FAKE_DI_DEFAULT_PAGES = int(os.getenv("FAKE_DI_DEFAULT_PAGES", "3"))
+
+operations: Dict[str, Dict[str, Any]] = {}
+
+def parse_pages(pages: str, page_count: int) -> List[int]:
+    if not pages:
+        return list(range(1, page_count + 1))
+    out: List[int] = []
+    for part in pages.split(","):
+        start, _, end = part.partition("-")
+        out.extend(range(int(start), int(end or start) + 1))
+    return out
+
+def region(page: int, y: float) -> List[Dict[str, Any]]:
+    return [{"pageNumber": page, "polygon": [1.0, y, 7.0, y, 7.0, y + 0.5, 1.0, y + 0.5]}]
+
+def build_result(model_id: str, pages: List[int]) -> Dict[str, Any]:
+    content = ""
+    paragraphs: List[Dict[str, Any]] = []
+    tables: List[Dict[str, Any]] = []
+
+    def add(text: str) -> Dict[str, Any]:
+        nonlocal content
+        if content:
+            content += "\n"
+        span = {"offset": len(content), "length": len(text)}
+        content += text
+        return span
+
+    for page in pages:
+        for i in range(2):
+            text = f"Page {page} paragraph {i + 1}."
+            paragraphs.append({"content": text, "spans": [add(text)], "boundingRegions": region(page, 1.0 + i)})
+
+        cells = []
+        for r in range(2):
+            for c in range(2):
+                text = f"p{page}r{r}c{c}"
+                cells.append({"rowIndex": r, "columnIndex": c, "content": text, "spans": [add(text)]})
+        first, last = cells[0]["spans"][0], cells[-1]["spans"][0]
+        tables.append({
+            "rowCount": 2,
+            "columnCount": 2,
+            "cells": cells,
+            "spans": [{"offset": first["offset"], "length": last["offset"] + last["length"] - first["offset"]}],
+            "boundingRegions": region(page, 4.0),
+        })
+
+    return {
+        "apiVersion": "2024-11-30",
+        "modelId": model_id,
+        "content": content,
+        "pages": [{"pageNumber": p, "spans": []} for p in pages],
+        "paragraphs": paragraphs,
+        "tables": tables,
+    }
+
+@app.post("/documentintelligence/documentModels/{model_action}")
+async def analyze(model_action: str, request: Request):
+    model_id = model_action.split(":")[0]
+    body = await request.body()
+    page_count = count_pdf_pages(body) or FAKE_DI_DEFAULT_PAGES
+    pages = parse_pages(request.query_params.get("pages", ""), page_count)
+
+    result_id = str(uuid.uuid4())
+    operations[result_id] = {
+        "ready_at": time.monotonic() + FAKE_DI_LATENCY_SECONDS,
+        "result": build_result(model_id, pages),
+    }
+
+    location = f"{str(request.base_url).rstrip('/')}/documentintelligence/documentModels/{model_id}/analyzeResults/{result_id}"
+    return Response(status_code=202, headers={"Operation-Location": location, "Retry-After": "0"})
+
+@app.get("/documentintelligence/documentModels/{model_id}/analyzeResults/{result_id}")
+async def analyze_result(model_id: str, result_id: str):
+    op = operations[result_id]
+    if time.monotonic() < op["ready_at"]:
+        await asyncio.sleep(0.05)
+        return {"status": "running"}
+    return {"status": "succeeded", "analyzeResult": op["result"]}
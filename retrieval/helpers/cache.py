@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(text: str) -> str:
+    # Case, Unicode form and whitespace do not change what is being asked
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip().lower()
+
+def cache_key(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+class TTLCache:
+    # In-process LRU with a per-entry time to live. max_entries=0 disables it;
+    # max_bytes > 0 also bounds the total of the sizes passed to put().
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or (self.ttl_seconds > 0 and time.time() - entry[1] > self.ttl_seconds):
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, value: Any, size: int = 0):
+        if self.max_entries <= 0 or (self.max_bytes > 0 and size > self.max_bytes):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.time(), size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+class SqliteCache:
+    # Key/value table in a local SQLite file, so every uvicorn worker on the host
+    # shares one cache. Calls block briefly; run them with asyncio.to_thread. They then
+    # run on several threads at once, so the hit/miss counters are kept under a lock.
+
+    def __init__(self, path: str, table: str, ttl_seconds: float):
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_dir = os.path.dirname(self.path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connect().execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        with self._counter_lock:
+            if row is None or (self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, value: bytes):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)", (key, value, now))
+            if self.ttl_seconds > 0:
+                db.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        entries = self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            "path": self.path,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
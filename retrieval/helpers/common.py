@@ -1,4 +1,5 @@
 import json
+import re
 from helpers.prompts import VALIDATION_SCHEMA, VALIDATION_PROMPT
 
 def build_context_from_hits(hits, max_chunks=5):
@@ -78,4 +79,74 @@ def build_final_response(rag_answer: dict, validation_json: dict) -> dict:
             "issues": unsupported_claims,
             "notes": validation_json.get("notes")
         }
-    }
\ No newline at end of file
+    }
+
+def citations_from_hits(hits) -> list:
+    # The sources the answer can cite, known before any token is generated
+    seen = set()
+    out = []
+    for h in hits:
+        key = (h.get("source_url"), h.get("chunk_id"))
+        if key not in seen:
+            seen.add(key)
+            out.append({"title": h.get("title"), "source_url": h.get("source_url"), "chunk_id": h.get("chunk_id")})
+    return out
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+ANSWER_KEY = re.compile(r'"answer"\s*:\s*"')
+
+class AnswerStreamDecoder:
+    # The model streams a JSON object; this pulls the decoded text of its "answer"
+    # string out of the raw fragments as they arrive, so it can be shown before the
+    # object is complete. An escape split across fragments waits for the next one.
+
+    def __init__(self):
+        self.raw = ""
+        self.pos = -1
+        self.done = False
+
+    def feed(self, fragment: str) -> str:
+        self.raw += fragment
+        if self.done:
+            return ""
+        if self.pos < 0:
+            m = ANSWER_KEY.search(self.raw)
+            if not m:
+                return ""
+            self.pos = m.end()
+
+        out = []
+        raw = self.raw
+        i = self.pos
+        while i < len(raw):
+            c = raw[i]
+            if c == '"':
+                self.done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(raw):
+                break
+            e = raw[i + 1]
+            if e == "u":
+                if i + 6 > len(raw):
+                    break
+                code = int(raw[i + 2:i + 6], 16)
+                # A surrogate pair is two escapes; wait for the second half
+                if 0xD800 <= code < 0xDC00:
+                    if i + 12 > len(raw):
+                        break
+                    low = int(raw[i + 8:i + 12], 16)
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                out.append(chr(code))
+                i += 6
+                continue
+            out.append(ESCAPES.get(e, e))
+            i += 2
+        self.pos = i
+        return "".join(out)
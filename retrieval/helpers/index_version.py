@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+import json
+import os
+import time
+
+load_dotenv()
+
+# Written by the ingestion service after every upload or delete (see its
+# helpers/index_version.py); both services must point at the same file. The default,
+# .cache/ at the repository root, does not depend on the working directory.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE") or os.path.join(REPO_ROOT, ".cache", "index_version.json")
+INDEX_VERSION_SETTLE_SECONDS = os.getenv("INDEX_VERSION_SETTLE_SECONDS", "5")
+
+_cached: Dict[str, Any] = {"mtime": None, "stamp": None}
+
+def current_index_version() -> Optional[Dict[str, Any]]:
+    # One stat per call; the file is only re-read when it changed
+    try:
+        mtime = os.stat(INDEX_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime != _cached["mtime"]:
+        try:
+            with open(INDEX_VERSION_FILE, encoding="utf-8") as f:
+                _cached["stamp"] = json.load(f)
+            _cached["mtime"] = mtime
+        except (FileNotFoundError, ValueError):
+            return _cached["stamp"]
+    return _cached["stamp"]
+
+def index_settling(stamp: Optional[Dict[str, Any]]) -> bool:
+    # Writes take a moment to become searchable, so answers right after a change may
+    # still reflect the old content and are not worth caching
+    return stamp is not None and time.time() - stamp.get("updated_at", 0) < float(INDEX_VERSION_SETTLE_SECONDS)
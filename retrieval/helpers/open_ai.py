@@ -1,9 +1,13 @@
 from dotenv import load_dotenv
 import os
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+from array import array
+from typing import Any, AsyncIterator, Dict, Optional
+import asyncio
 import json
 from helpers.prompts import TECH_SYSTEM_PROMPT, FINANCE_SYSTEM_PROMPT
-from helpers.common import build_validation_prompt, compute_confidence_from_claims, compute_verdict, build_final_response
+from helpers.common import build_validation_prompt, compute_confidence_from_claims, compute_verdict, build_final_response, AnswerStreamDecoder
+from helpers.cache import TTLCache, SqliteCache, normalize_prompt, cache_key
 
 load_dotenv()
 
@@ -11,21 +15,95 @@ OAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 OAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 OAI_EMBED_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 OAI_MODEL_DEPLOYMENT = os.getenv("AZURE_OPENAI_MODEL_DEPLOYMENT")
+EMBEDDING_DIMENSIONS = os.getenv("EMBEDDING_DIMENSIONS", "")
+QUERY_EMBEDDING_CACHE_SIZE = os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "3600")
+QUERY_EMBEDDING_CACHE_DB = os.getenv("QUERY_EMBEDDING_CACHE_DB", "")
 
-oai_client = AzureOpenAI(
-    azure_endpoint=OAI_ENDPOINT,
-    api_key=OAI_KEY,
-    api_version="2024-10-21",
+# One client per worker, shared by every request; opened and closed by the app's
+# lifespan (main.py), created on first use otherwise
+_oai_client: Optional[AsyncAzureOpenAI] = None
+
+def get_oai_client() -> AsyncAzureOpenAI:
+    global _oai_client
+    if _oai_client is None:
+        _oai_client = AsyncAzureOpenAI(
+            azure_endpoint=OAI_ENDPOINT,
+            api_key=OAI_KEY,
+            api_version="2024-10-21",
+        )
+    return _oai_client
+
+async def close_oai_client():
+    global _oai_client
+    if _oai_client is not None:
+        await _oai_client.close()
+        _oai_client = None
+
+# Query vectors by normalized prompt and embedding deployment/dimensions. The LRU is
+# per worker; QUERY_EMBEDDING_CACHE_DB adds a SQLite file shared by all workers.
+_query_vectors = TTLCache(int(QUERY_EMBEDDING_CACHE_SIZE), float(QUERY_EMBEDDING_CACHE_TTL_SECONDS))
+_shared_query_vectors = (
+    SqliteCache(QUERY_EMBEDDING_CACHE_DB, "query_embeddings", float(QUERY_EMBEDDING_CACHE_TTL_SECONDS))
+    if QUERY_EMBEDDING_CACHE_DB and int(QUERY_EMBEDDING_CACHE_SIZE) > 0 else None
 )
+# Identical prompts that arrive together share one lookup and embedding call
+_pending_embeddings: Dict[str, "asyncio.Task[list[float]]"] = {}
+_embedding_counts = {"embedding_calls": 0, "coalesced": 0}
 
-def embed_query(text: str) -> list[float]:
-    response = oai_client.embeddings.create(
+async def _embed(text: str) -> list[float]:
+    # Must match the ingestion service's EMBEDDING_DIMENSIONS (and the index field)
+    options = {"dimensions": int(EMBEDDING_DIMENSIONS)} if EMBEDDING_DIMENSIONS else {}
+    response = await get_oai_client().embeddings.create(
         model=OAI_EMBED_DEPLOYMENT,
         input=text,
+        **options,
     )
     return response.data[0].embedding
 
-def generate_llm_response(context: str, prompt: str, prompt_type: str):
+async def _load_query_vector(key: str, text: str) -> list[float]:
+    if _shared_query_vectors is not None:
+        blob = await asyncio.to_thread(_shared_query_vectors.get, key)
+        if blob is not None:
+            vector = array("f", blob).tolist()
+            _query_vectors.put(key, vector)
+            return vector
+
+    _embedding_counts["embedding_calls"] += 1
+    vector = await _embed(text)
+    _query_vectors.put(key, vector)
+    if _shared_query_vectors is not None:
+        await asyncio.to_thread(_shared_query_vectors.put, key, array("f", vector).tobytes())
+    return vector
+
+def _finish_pending(key: str, task: "asyncio.Task[list[float]]"):
+    _pending_embeddings.pop(key, None)
+    if not task.cancelled():
+        task.exception()
+
+async def embed_query(text: str) -> list[float]:
+    key = cache_key(OAI_EMBED_DEPLOYMENT, EMBEDDING_DIMENSIONS, normalize_prompt(text))
+    vector = _query_vectors.get(key)
+    if vector is not None:
+        return vector
+
+    # The lookup runs as its own task, so one caller disconnecting does not fail the others
+    task = _pending_embeddings.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_query_vector(key, text))
+        _pending_embeddings[key] = task
+        task.add_done_callback(lambda t: _finish_pending(key, t))
+    else:
+        _embedding_counts["coalesced"] += 1
+    return await asyncio.shield(task)
+
+def query_embedding_cache_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"memory": _query_vectors.stats(), **_embedding_counts}
+    if _shared_query_vectors is not None:
+        stats["shared"] = _shared_query_vectors.stats()
+    return stats
+
+def _answer_messages(context: str, prompt: str, prompt_type: str) -> list:
 
     SYSTEM_PROMPT = ""
     
@@ -34,29 +112,52 @@ def generate_llm_response(context: str, prompt: str, prompt_type: str):
     else:
         SYSTEM_PROMPT = FINANCE_SYSTEM_PROMPT
     
-    response = oai_client.chat.completions.create(
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Context:\n{context}\n\nQuestion:\n{prompt}"
+        }
+    ]
+
+async def generate_llm_response(context: str, prompt: str, prompt_type: str):
+    response = await get_oai_client().chat.completions.create(
         model=OAI_MODEL_DEPLOYMENT,
-        messages=[
-            {
-                "role": "system",
-                "content": SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": f"Context:\n{context}\n\nQuestion:\n{prompt}"
-            }
-        ],
+        messages=_answer_messages(context, prompt, prompt_type),
         temperature=0.1,
         max_completion_tokens=1500
     )
     answer = response.choices[0].message.content
     parsed_answer = json.loads(answer)
     return parsed_answer
+
+async def stream_llm_response(context: str, prompt: str, prompt_type: str) -> AsyncIterator[Dict[str, Any]]:
+    # Same call as generate_llm_response, streamed. Yields {"token": text} for each new
+    # piece of the answer text, then {"answer": parsed} once the JSON is complete.
+    stream = await get_oai_client().chat.completions.create(
+        model=OAI_MODEL_DEPLOYMENT,
+        messages=_answer_messages(context, prompt, prompt_type),
+        temperature=0.1,
+        max_completion_tokens=1500,
+        stream=True
+    )
+    decoder = AnswerStreamDecoder()
+    async for chunk in stream:
+        # Azure sends content-filter chunks without choices
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        text = decoder.feed(chunk.choices[0].delta.content)
+        if text:
+            yield {"token": text}
+    yield {"answer": json.loads(decoder.raw)}
     
 
-def guardrail_validate(context: str, prompt: str, rag_answer: dict):
+async def guardrail_validate(context: str, prompt: str, rag_answer: dict):
     validation_prompt = build_validation_prompt(context=context, prompt=prompt, rag_answer=rag_answer)
-    validation_response = oai_client.chat.completions.create(
+    validation_response = await get_oai_client().chat.completions.create(
         model=OAI_MODEL_DEPLOYMENT,
         messages=[
             {"role": "system", "content": "You are a strict JSON-only validation agent."},
@@ -0,0 +1,48 @@
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+import json
+import os
+from helpers.cache import TTLCache, normalize_prompt, cache_key
+from helpers.index_version import current_index_version, index_settling
+from helpers.open_ai import OAI_MODEL_DEPLOYMENT
+
+load_dotenv()
+
+RESPONSE_CACHE_SIZE = os.getenv("RESPONSE_CACHE_SIZE", "512")
+RESPONSE_CACHE_TTL_SECONDS = os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900")
+RESPONSE_CACHE_MAX_BYTES = os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 ** 2))
+
+# Final /get-response payloads by (model deployment, prompt type, normalized prompt),
+# valid for one index version. When the ingestion service bumps the version the whole
+# cache is dropped, so an answer is never served from content that changed.
+_responses = TTLCache(int(RESPONSE_CACHE_SIZE), float(RESPONSE_CACHE_TTL_SECONDS), int(RESPONSE_CACHE_MAX_BYTES))
+_state: Dict[str, Any] = {"version": None, "invalidations": 0}
+SETTLING = "settling"
+
+def response_cache_version() -> Optional[str]:
+    # Read once per request, before retrieval, so the answer is filed under the version
+    # it was computed against. Right after a change search may still return the old
+    # content, so nothing is cached until the version has settled.
+    stamp = current_index_version()
+    version = stamp["version"] if stamp else None
+    if version != _state["version"]:
+        if _state["version"] is not None:
+            _state["invalidations"] += 1
+        _responses.clear()
+        _state["version"] = version
+    return SETTLING if index_settling(stamp) else version
+
+def get_cached_response(prompt: str, prompt_type: Optional[str], version: Optional[str]) -> Optional[Dict[str, Any]]:
+    if version == SETTLING:
+        return None
+    return _responses.get(cache_key(OAI_MODEL_DEPLOYMENT, prompt_type, version, normalize_prompt(prompt)))
+
+def put_cached_response(prompt: str, prompt_type: Optional[str], version: Optional[str], response: Dict[str, Any]):
+    # Skipped when the index changed while the answer was being generated
+    if version == SETTLING or version != _state["version"] or response_cache_version() != version:
+        return
+    size = len(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+    _responses.put(cache_key(OAI_MODEL_DEPLOYMENT, prompt_type, version, normalize_prompt(prompt)), response, size)
+
+def response_cache_stats() -> Dict[str, Any]:
+    return {**_responses.stats(), "index_version": _state["version"], "invalidations": _state["invalidations"]}
@@ -1,7 +1,8 @@
 from dotenv import load_dotenv
 import os
-from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient
 from azure.core.credentials import AzureKeyCredential
+from typing import Optional
 from helpers.open_ai import embed_query
 
 load_dotenv()
@@ -15,16 +16,30 @@ SELECT_FIELDS = ["id", "kind", "title", "source_url", "chunk", "chunk_id"]
 SEMANTIC_CONFIG_NAME = f"{INDEX_NAME}-semantic-configuration"
 TOP_K = 5
 
-search_client = SearchClient(
-    endpoint=SEARCH_ENDPOINT,
-    index_name=INDEX_NAME,
-    credential=AzureKeyCredential(SEARCH_KEY)
-)
+# Shared per worker like the OpenAI client (see helpers/open_ai.py)
+_search_client: Optional[SearchClient] = None
 
-def hybrid_semantic_vector_search(prompt: str, k: int = TOP_K):
-    qvec = embed_query(prompt)
+def get_search_client() -> SearchClient:
+    global _search_client
+    if _search_client is None:
+        _search_client = SearchClient(
+            endpoint=SEARCH_ENDPOINT,
+            index_name=INDEX_NAME,
+            credential=AzureKeyCredential(SEARCH_KEY)
+        )
+    return _search_client
 
-    results = search_client.search(
+async def close_search_client():
+    global _search_client
+    if _search_client is not None:
+        await _search_client.close()
+        _search_client = None
+
+async def hybrid_semantic_vector_search(prompt: str, k: int = TOP_K, qvec: Optional[list] = None):
+    if qvec is None:
+        qvec = await embed_query(prompt)
+
+    results = await get_search_client().search(
         search_text=prompt,
         vector_queries=[{
             "kind": "vector",
@@ -40,7 +55,7 @@ def hybrid_semantic_vector_search(prompt: str, k: int = TOP_K):
     )
 
     out = []
-    for r in results:
+    async for r in results:
         out.append({
             "score": r.get("@search.score"),
             "rerankerScore": r.get("@search.reranker_score"),
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+import os
+import time
+import numpy as np
+
+load_dotenv()
+
+SEMANTIC_CACHE_THRESHOLD = os.getenv("SEMANTIC_CACHE_THRESHOLD", "0")
+SEMANTIC_CACHE_SIZE = os.getenv("SEMANTIC_CACHE_SIZE", "1000")
+SEMANTIC_CACHE_TTL_SECONDS = os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")
+SEMANTIC_CACHE_VERDICTS = os.getenv("SEMANTIC_CACHE_VERDICTS", "grounded")
+
+def semantic_cache_enabled() -> bool:
+    return float(SEMANTIC_CACHE_THRESHOLD) > 0
+
+class SemanticAnswerCache:
+    # Validated answers of one prompt type, looked up by cosine similarity of the query
+    # vector. Vectors are unit rows of one float32 matrix, so a lookup is a single
+    # matrix-vector product; when full, the least recently used row is overwritten.
+
+    def __init__(self, capacity: int, ttl_seconds: float):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.vectors: Optional[np.ndarray] = None
+        self.answers: List[Optional[Dict[str, Any]]] = []
+        self.created = np.zeros(capacity)
+        self.used = np.zeros(capacity)
+        self.size = 0
+
+    def clear(self):
+        self.vectors = None
+        self.answers = []
+        self.size = 0
+
+    def _unit(self, vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def lookup(self, vector: List[float]) -> Optional[Dict[str, Any]]:
+        # Best live match as {"similarity", "answer"}, whatever its score
+        if not self.size or self.vectors is None or self.vectors.shape[1] != len(vector):
+            return None
+        sims = self.vectors[:self.size] @ self._unit(vector)
+        if self.ttl_seconds > 0:
+            sims[time.time() - self.created[:self.size] > self.ttl_seconds] = -1.0
+        best = int(np.argmax(sims))
+        if sims[best] <= -1.0:
+            return None
+        self.used[best] = time.time()
+        return {"similarity": float(sims[best]), "answer": self.answers[best]}
+
+    def add(self, vector: List[float], answer: Dict[str, Any]):
+        if self.capacity <= 0:
+            return
+        if self.vectors is None or self.vectors.shape[1] != len(vector):
+            self.clear()
+            self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            self.answers = [None] * self.capacity
+        if self.size < self.capacity:
+            row = self.size
+            self.size += 1
+        else:
+            row = int(np.argmin(self.used))
+        now = time.time()
+        self.vectors[row] = self._unit(vector)
+        self.answers[row] = answer
+        self.created[row] = now
+        self.used[row] = now
+
+# One cache per prompt type; a finance answer is never reused for a technology prompt
+_caches: Dict[Optional[str], SemanticAnswerCache] = {}
+_state: Dict[str, Any] = {"version": None, "hits": 0, "misses": 0, "hit_similarity_sum": 0.0}
+
+def _cache_for(prompt_type: Optional[str], version: Optional[str]) -> SemanticAnswerCache:
+    if version != _state["version"]:
+        for cache in _caches.values():
+            cache.clear()
+        _state["version"] = version
+    if prompt_type not in _caches:
+        _caches[prompt_type] = SemanticAnswerCache(int(SEMANTIC_CACHE_SIZE), float(SEMANTIC_CACHE_TTL_SECONDS))
+    return _caches[prompt_type]
+
+def find_similar_answer(prompt_type: Optional[str], vector: List[float], version: Optional[str]) -> Optional[Dict[str, Any]]:
+    threshold = float(SEMANTIC_CACHE_THRESHOLD)
+    match = _cache_for(prompt_type, version).lookup(vector)
+    # Logged either way so the threshold can be tuned from real traffic
+    if match and match["similarity"] >= threshold:
+        _state["hits"] += 1
+        _state["hit_similarity_sum"] += match["similarity"]
+        print(f"Semantic cache hit ({prompt_type}): similarity {match['similarity']:.4f} >= {threshold}....")
+        return match["answer"]
+    _state["misses"] += 1
+    best = f"{match['similarity']:.4f}" if match else "n/a"
+    print(f"Semantic cache miss ({prompt_type}): best similarity {best} < {threshold}....")
+    return None
+
+def remember_answer(prompt_type: Optional[str], vector: List[float], version: Optional[str], response: Dict[str, Any]):
+    # Only answers the guardrail accepted are reused for other phrasings
+    verdicts = {v.strip() for v in SEMANTIC_CACHE_VERDICTS.split(",") if v.strip()}
+    if (response.get("guardrail") or {}).get("verdict") not in verdicts:
+        return
+    _cache_for(prompt_type, version).add(vector, response)
+
+def semantic_cache_stats() -> Dict[str, Any]:
+    return {
+        "enabled": semantic_cache_enabled(),
+        "threshold": float(SEMANTIC_CACHE_THRESHOLD),
+        "entries": {str(t): c.size for t, c in _caches.items()},
+        "capacity": int(SEMANTIC_CACHE_SIZE),
+        "hits": _state["hits"],
+        "misses": _state["misses"],
+        "mean_hit_similarity": round(_state["hit_similarity_sum"] / _state["hits"], 4) if _state["hits"] else None,
+    }
@@ -1,12 +1,26 @@
 from fastapi import FastAPI
 from fastapi import Request
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 import json
-from helpers.search import hybrid_semantic_vector_search
-from helpers.common import build_context_from_hits
-from helpers.open_ai import generate_llm_response, guardrail_validate
+from helpers.search import hybrid_semantic_vector_search, get_search_client, close_search_client
+from helpers.common import build_context_from_hits, citations_from_hits
+from helpers.response_cache import SETTLING, response_cache_version, get_cached_response, put_cached_response, response_cache_stats
+from helpers.semantic_cache import semantic_cache_enabled, find_similar_answer, remember_answer, semantic_cache_stats
+from helpers.open_ai import embed_query, generate_llm_response, stream_llm_response, guardrail_validate, get_oai_client, close_oai_client, query_embedding_cache_stats
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Async clients are shared by every request on this worker; their connection
+    # pools live as long as the app
+    get_oai_client()
+    get_search_client()
+    yield
+    await close_search_client()
+    await close_oai_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +33,15 @@ app.add_middleware(
 def index():
     return {"response": "hello world v2"}
 
+@app.get("/cache-stats")
+def cache_stats():
+    # Per worker: each uvicorn worker keeps its own counters
+    return {
+        "query_embeddings": query_embedding_cache_stats(),
+        "responses": response_cache_stats(),
+        "semantic": semantic_cache_stats(),
+    }
+
 @app.post("/get-response")
 async def get_response(request: Request):
     
@@ -26,16 +49,91 @@ async def get_response(request: Request):
     prompt = body.get("prompt")
     prompt_type = body.get("type")
 
+    version = response_cache_version()
+    cached = get_cached_response(prompt, prompt_type, version)
+    if cached is not None:
+        print("Returning cached response for unchanged index....")
+        return cached
+
+    # The query vector serves both the paraphrase lookup and the vector search
+    qvec = await embed_query(prompt)
+    use_semantic = semantic_cache_enabled() and version != SETTLING
+    if use_semantic:
+        similar = find_similar_answer(prompt_type, qvec, version)
+        if similar is not None:
+            return similar
+
     print("Performing hybrid search against search index....")
-    hits = hybrid_semantic_vector_search(prompt, k=5)
+    hits = await hybrid_semantic_vector_search(prompt, k=5, qvec=qvec)
 
     print("Building context from search result....")
     context = build_context_from_hits(hits)
 
     print("Generating augmented LLM response....")
-    rag_answer = generate_llm_response(context=context, prompt=prompt, prompt_type=prompt_type)
+    rag_answer = await generate_llm_response(context=context, prompt=prompt, prompt_type=prompt_type)
     
     print("Performing guardrail validation for hallucination check....")
-    validated_response = guardrail_validate(context=context, prompt=prompt, rag_answer=rag_answer)
+    validated_response = await guardrail_validate(context=context, prompt=prompt, rag_answer=rag_answer)
+
+    remember_response(prompt, prompt_type, version, qvec, use_semantic, validated_response)
+    return validated_response
+
+def remember_response(prompt, prompt_type, version, qvec, use_semantic, response):
+    put_cached_response(prompt, prompt_type, version, response)
+    if use_semantic and response_cache_version() == version:
+        remember_answer(prompt_type, qvec, version, response)
 
-    return validated_response
\ No newline at end of file
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def response_events(prompt: str, prompt_type: str):
+    # retrieval (hits and citable sources) -> token* (answer text) -> final (the
+    # same object /get-response returns, with the guardrail verdict)
+    try:
+        version = response_cache_version()
+        cached = get_cached_response(prompt, prompt_type, version)
+        qvec = None
+        use_semantic = False
+        if cached is None:
+            qvec = await embed_query(prompt)
+            use_semantic = semantic_cache_enabled() and version != SETTLING
+            if use_semantic:
+                cached = find_similar_answer(prompt_type, qvec, version)
+        if cached is not None:
+            print("Streaming cached response....")
+            yield sse("retrieval", {"hits": [], "citations": cached.get("citations", []), "cached": True})
+            yield sse("token", {"text": cached.get("answer") or ""})
+            yield sse("final", cached)
+            return
+
+        print("Performing hybrid search against search index....")
+        hits = await hybrid_semantic_vector_search(prompt, k=5, qvec=qvec)
+        yield sse("retrieval", {"hits": hits, "citations": citations_from_hits(hits), "cached": False})
+
+        context = build_context_from_hits(hits)
+        print("Streaming augmented LLM response....")
+        rag_answer = None
+        async for part in stream_llm_response(context=context, prompt=prompt, prompt_type=prompt_type):
+            if "token" in part:
+                yield sse("token", {"text": part["token"]})
+            else:
+                rag_answer = part["answer"]
+
+        print("Performing guardrail validation for hallucination check....")
+        validated_response = await guardrail_validate(context=context, prompt=prompt, rag_answer=rag_answer)
+        remember_response(prompt, prompt_type, version, qvec, use_semantic, validated_response)
+        yield sse("final", validated_response)
+    except Exception as e:
+        # Headers are already sent, so failures are reported in-band
+        print(f"Streaming response failed: {e}....")
+        yield sse("error", {"message": str(e)})
+
+@app.post("/get-response/stream")
+async def get_response_stream(request: Request):
+    body = await request.json()
+    return StreamingResponse(
+        response_events(body.get("prompt"), body.get("type")),
+        media_type="text/event-stream",
+        # Keep proxies (nginx, ngrok) from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file